@@ -0,0 +1,87 @@
+from checkpoint import BATCH_SIZE
+
+
+def estimate_bytes(rows, samples=100):
+    """Estimates the payload size of rows from an evenly spaced sample"""
+    if not rows:
+        return 0
+
+    step = max(1, len(rows) // samples)
+    sampled = rows[::step]
+    size = 0
+    for row in sampled:
+        for value in row:
+            if isinstance(value, (str, bytes, bytearray)):
+                size += len(value)
+            else:
+                size += 8
+    return size * len(rows) // len(sampled)
+
+
+class AdaptiveBatchSize:
+    """
+    Batch size of one table, grown or shrunk after every batch so that a batch
+    takes about target_duration seconds and stays below max_bytes.
+    """
+
+    def __init__(self, conf, initial):
+        self.conf = conf
+        self.size = self._clamp(initial)
+
+    def _clamp(self, size):
+        return int(max(self.conf.min_batch_size, min(self.conf.max_batch_size, size)))
+
+    def update(self, values, duration):
+        """Returns True when the size changed"""
+        rows = len(values)
+        nbytes = estimate_bytes(values)
+        size = self.size
+        # a short batch means the table is caught up, it says nothing about the right size
+        if rows >= self.size and duration > 0:
+            size = size * max(0.5, min(2.0, self.conf.target_duration / duration))
+        if rows and nbytes:
+            size = min(size, self.conf.max_bytes * rows / nbytes)
+
+        size = self._clamp(size)
+        changed = size != self.size
+        self.size = size
+        return changed
+
+
+class FixedBatchSize:
+    def __init__(self, size):
+        self.size = size
+
+    def update(self, values, duration):
+        return False
+
+
+def get_batch_size(scheme_conf, checkpoints, table_name):
+    if not scheme_conf.adaptive_batching:
+        return FixedBatchSize(scheme_conf.batch_size)
+
+    learned = checkpoints.get(table_name, name=BATCH_SIZE)
+    initial = int(learned) if learned else scheme_conf.batch_size
+    return AdaptiveBatchSize(scheme_conf.adaptive_batching, initial)
+
+
+def fetch_bounded(fetchmany, max_bytes, max_chunk=1000):
+    """
+    Fetches rows chunk by chunk until there are none left or their estimated
+    payload reaches max_bytes, chunks being sized from the rows seen so far so
+    that wide rows do not overshoot it. Returns the rows and False when they
+    were cut short by max_bytes.
+    """
+    rows = []
+    size = 0
+    chunk = 1
+    while True:
+        fetched = fetchmany(chunk)
+        if not fetched:
+            return rows, True
+        rows.extend(fetched)
+        size += estimate_bytes(fetched)
+        if size >= max_bytes:
+            return rows, False
+        row_bytes = max(1, size // len(rows))
+        chunk = int(max(1, min(max_chunk, (max_bytes - size) // row_bytes)))
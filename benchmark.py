@@ -0,0 +1,266 @@
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import sys
+import time
+import sqlalchemy
+import config as conf
+from executor import ReplicationPool
+from helpers import get_engine
+from metrics import metrics
+from replicator import SchemeReplicator
+from sqlalchemy import MetaData, Table, Column, Integer, DateTime, String, Index
+from sqlalchemy_utils import database_exists, create_database, drop_database
+
+SOURCE_DB = 'bench_src'
+TARGET_DB = 'bench_trg'
+# histogram whose percentiles are reported as the batch latency of each phase
+LATENCY_METRICS = {
+    'include': 'timeds_batch_seconds',
+    'views': 'timeds_view_seconds',
+    'dynamic': 'timeds_dynamic_chunk_seconds',
+    'noop': 'timeds_batch_seconds',
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(fraction * (len(values) - 1))))]
+
+
+def peak_rss_kb():
+    """Peak RSS over the lifetime of the process, hence every phase runs in a process of its own"""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes on Linux
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+def host_conf(args, role):
+    if args.driver == 'sqlite':
+        directory = os.path.join(args.workdir, role)
+        os.makedirs(directory, exist_ok=True)
+        return {'host': directory, 'port': 1, 'driver': 'sqlite', 'username': 'bench', 'password': 'bench',
+                'max_concurrency': 1 if role == 'target' else 0}
+
+    return {'host': args.host, 'port': args.port, 'driver': args.driver,
+            'username': args.username, 'password': args.password}
+
+
+def reset_database(engine):
+    if database_exists(engine.url):
+        drop_database(engine.url)
+    create_database(engine.url)
+
+
+def generate_source(args, engine):
+    """Creates the synthetic source: timestamped tables, dynamic tables and views over them"""
+    metadata = MetaData(bind=engine)
+    start = datetime.datetime(2020, 1, 1)
+
+    for i in range(args.tables):
+        table = Table('t_%s' % i, metadata,
+                      Column('id', Integer, primary_key=True, autoincrement=False),
+                      Column('ts', DateTime, nullable=False),
+                      Column('payload', String(args.width)),
+                      Index('ix_t_%s_ts' % i, 'ts'))
+        table.create()
+        rows_per_ts = max(1, args.rows_per_timestamp)
+        insert_rows(engine, table, args.rows, lambda n: {
+            'id': n, 'ts': start + datetime.timedelta(seconds=n // rows_per_ts), 'payload': 'x' * args.width})
+
+    for i in range(args.dynamic):
+        table = Table('d_%s' % i, metadata,
+                      Column('id', Integer, primary_key=True, autoincrement=False),
+                      Column('payload', String(args.width)))
+        table.create()
+        insert_rows(engine, table, args.dynamic_rows, lambda n: {'id': n, 'payload': 'x' * args.width})
+
+    for i in range(args.views if args.tables else 0):
+        engine.execute('CREATE VIEW v_%s AS SELECT id, ts FROM t_%s' % (i, i % args.tables))
+
+
+def insert_rows(engine, table, count, make_row, chunk=10000):
+    for offset in range(0, count, chunk):
+        engine.execute(table.insert(), [make_row(n) for n in range(offset, min(count, offset + chunk))])
+
+
+def run_phase(name, scheme_name, scheme, args, only_dynamic_and_views=False):
+    metrics.reset()
+    pool = ReplicationPool(args.workers)
+    start = time.time()
+    SchemeReplicator(scheme_name, scheme, only_dynamic_and_views=only_dynamic_and_views).run(pool)
+    pool.join()
+    pool.shutdown()
+    elapsed = time.time() - start
+
+    rows = metrics.total('timeds_rows_total')
+    batches = metrics.samples.get(LATENCY_METRICS[name], [])
+    return {
+        'phase': name,
+        'seconds': elapsed,
+        'rows': rows,
+        'rows_per_sec': rows / elapsed if elapsed else None,
+        'batches': len(batches),
+        'batch_p50_seconds': percentile(batches, 0.5),
+        'batch_p99_seconds': percentile(batches, 0.99),
+        'reflection_seconds': metrics.total('timeds_reflection_seconds'),
+        'errors': metrics.total('timeds_errors_total'),
+        'peak_rss_kb': peak_rss_kb(),
+    }
+
+
+def phase_process(name, scheme_dict, args, only_dynamic_and_views):
+    metrics.enabled = True
+    metrics.keep_samples = True
+    return run_phase(name, 'benchmark', conf.Scheme('benchmark', scheme_dict), args, only_dynamic_and_views)
+
+
+def spawn_phase(name, scheme_dict, args, only_dynamic_and_views=False):
+    """
+    Runs a phase in a freshly spawned interpreter, so that its peak RSS is its
+    own and not that of the data generation or of the previous phases
+    """
+    with multiprocessing.get_context('spawn').Pool(1) as pool:
+        return pool.apply(phase_process, (name, json.loads(json.dumps(scheme_dict)), args, only_dynamic_and_views))
+
+
+def set_option(scheme_dict, option):
+    """
+    Sets a KEY=JSON scheme option. Options of nested structures are dotted,
+    e.g. retry.attempts, and databases.KEY sets an option of the benchmarked
+    database. Raises ValueError for unknown options.
+    """
+    key, _, value = option.partition('=')
+    names = key.split('.')
+    structure, options = conf.root_structure, scheme_dict
+    for i, name in enumerate(names):
+        prototype = structure.get(name, None)
+        if prototype is None:
+            raise ValueError('unknown scheme option %s' % '.'.join(names[:i + 1]))
+        if i == len(names) - 1:
+            break
+        if prototype.child_type:
+            structure, options = prototype.child_type.type, options[name][0]
+        elif isinstance(prototype.type, dict):
+            structure, options = prototype.type, options.setdefault(name, {})
+        else:
+            raise ValueError('%s has no nested options' % '.'.join(names[:i + 1]))
+
+    value = json.loads(value)
+    if isinstance(prototype.type, dict) and isinstance(value, dict):
+        unknown = sorted(set(value) - set(prototype.type))
+        if unknown:
+            raise ValueError('unknown scheme option %s.%s' % (key, unknown[0]))
+    options[name] = value
+
+
+def compare(previous, current):
+    print('%-8s %-20s %14s %14s %8s' % ('phase', 'metric', 'previous', 'current', 'change'))
+    old_phases = {phase['phase']: phase for phase in previous['phases']}
+    for phase in current['phases']:
+        old = old_phases.get(phase['phase'], None)
+        if not old:
+            continue
+        for key in ('rows_per_sec', 'batch_p50_seconds', 'batch_p99_seconds', 'reflection_seconds', 'peak_rss_kb'):
+            if old.get(key) and phase.get(key) is not None:
+                print('%-8s %-20s %14.4f %14.4f %+7.1f%%' % (
+                    phase['phase'], key, old[key], phase[key], 100.0 * (phase[key] - old[key]) / old[key]))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark the replication engine against synthetic local databases')
+    parser.add_argument('--driver', default='sqlite', choices=['sqlite', 'mysql'],
+                        help='sqlite files in --workdir, or a local MySQL/MariaDB server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--username', default='root')
+    parser.add_argument('--password', default='')
+    parser.add_argument('--workdir', default='/tmp/timeds-bench', help='Working directory of the sqlite databases')
+    parser.add_argument('--tables', type=int, default=4, help='Timestamped tables')
+    parser.add_argument('--rows', type=int, default=100000, help='Rows per timestamped table')
+    parser.add_argument('--width', type=int, default=100, help='Payload bytes per row')
+    parser.add_argument('--rows-per-timestamp', type=int, default=1, help='Rows sharing one timestamp')
+    parser.add_argument('--dynamic', type=int, default=2, help='Dynamic tables')
+    parser.add_argument('--dynamic-rows', type=int, default=50000, help='Rows per dynamic table')
+    parser.add_argument('--views', type=int, default=2, help='Views')
+    parser.add_argument('--workers', type=int, default=4, help='Replication pool size')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--option', action='append', default=[], metavar='KEY=JSON',
+                        help='Extra scheme option, e.g. pipeline_depth=2, retry.attempts=3 or '
+                             'databases.keyset_pagination=true')
+    parser.add_argument('--output', default='benchmark.json', help='Results file')
+    parser.add_argument('--compare', default='', help='Previous results file to compare with')
+    args = parser.parse_args()
+
+    if args.driver == 'sqlite':
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+    scheme_dict = {
+        'source': host_conf(args, 'source'),
+        'target': host_conf(args, 'target'),
+        'batch_size': args.batch_size,
+        'databases': [{
+            'source': '^%s$' % SOURCE_DB,
+            'target': TARGET_DB,
+            'naming_strategy': 'exact',
+            'order_by': 'ts',
+            'dynamic_tables': '^d_',
+        }],
+    }
+    for option in args.option:
+        try:
+            set_option(scheme_dict, option)
+        except ValueError as e:
+            parser.error('--option %s: %s' % (option, e))
+    scheme = conf.Scheme('benchmark', json.loads(json.dumps(scheme_dict)))
+    # same scheme whose dynamic_tables matches nothing, to time the views on their own
+    views_dict = json.loads(json.dumps(scheme_dict))
+    views_dict['databases'][0]['dynamic_tables'] = '^$'
+
+    src_engine = get_engine(scheme.source, SOURCE_DB)
+    trg_engine = get_engine(scheme.target, TARGET_DB)
+    reset_database(src_engine)
+    reset_database(trg_engine)
+
+    generate_start = time.time()
+    generate_source(args, src_engine)
+    generate_seconds = time.time() - generate_start
+
+    phases = [
+        spawn_phase('include', scheme_dict, args),
+        spawn_phase('views', views_dict, args, only_dynamic_and_views=True),
+        spawn_phase('dynamic', scheme_dict, args, only_dynamic_and_views=True),
+        # nothing changed since the include phase: the fixed cost of a cycle
+        spawn_phase('noop', scheme_dict, args),
+    ]
+
+    results = {
+        'started_at': datetime.datetime.utcfromtimestamp(generate_start).isoformat(),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'arguments': vars(args),
+        'scheme_options': scheme_dict,
+        'generate_seconds': generate_seconds,
+        'phases': phases,
+    }
+    with open(args.output, 'w') as output:
+        json.dump(results, output, indent=2, default=str)
+
+    for phase in phases:
+        print(json.dumps(phase))
+
+    if args.compare:
+        with open(args.compare) as previous:
+            compare(json.load(previous), results)
+
+
+if __name__ == '__main__':
+    main()
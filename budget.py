@@ -0,0 +1,52 @@
+import threading as th
+
+
+class Reservation:
+    def __init__(self, budget, nbytes):
+        self.budget = budget
+        self.nbytes = nbytes
+
+    def release(self):
+        if self.nbytes:
+            self.budget.release(self.nbytes)
+            self.nbytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class MemoryBudget:
+    """
+    Process-wide bound of the bytes of the batches held by replicator threads
+    at once. A thread reserves the byte budget of a batch before fetching it
+    and releases it once the batch is written. 0 for no bound.
+    """
+
+    def __init__(self, limit=0):
+        self.limit = limit
+        self.used = 0
+        self.condition = th.Condition()
+
+    def reserve(self, nbytes, stopped):
+        """Blocks until nbytes are available or stopped is set"""
+        if not self.limit:
+            return Reservation(self, 0)
+
+        # a batch larger than the whole budget still runs, on its own
+        nbytes = min(nbytes, self.limit)
+        with self.condition:
+            while self.used + nbytes > self.limit and not stopped.is_set():
+                self.condition.wait(1)
+            self.used += nbytes
+        return Reservation(self, nbytes)
+
+    def release(self, nbytes):
+        with self.condition:
+            self.used -= nbytes
+            self.condition.notify_all()
+
+
+memory_budget = MemoryBudget()
@@ -0,0 +1,150 @@
+import binascii
+import datetime
+import decimal
+import threading as th
+from sqlalchemy import MetaData, Table, Column, String, Text, and_, select, event
+
+WATERMARK = 'watermark'
+FINGERPRINT = 'fingerprint'
+BATCH_SIZE = 'batch_size'
+CURSOR = 'cursor'
+SNAPSHOT = 'snapshot'
+ACTIVITY = 'activity'
+CYCLE = 'cycle'
+VIEW = 'view'
+INDEXES = 'indexes'
+
+
+def format_value(value):
+    if isinstance(value, (bytes, bytearray)):
+        return binascii.hexlify(value).decode('ascii')
+    return str(value)
+
+
+def parse_value(column_type, value):
+    """Converts a checkpointed value back to the Python type of the column it was read from"""
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return value
+
+    if python_type is datetime.datetime:
+        return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S.%f' if '.' in value else '%Y-%m-%d %H:%M:%S')
+    if python_type is datetime.date:
+        return datetime.datetime.strptime(value, '%Y-%m-%d').date()
+    if python_type in (int, float, decimal.Decimal):
+        return python_type(value)
+    if python_type is bytes:
+        return binascii.unhexlify(value)
+    return value
+
+
+class CheckpointStore:
+    """
+    Per-table replication state kept in a bookkeeping table on the target
+    database, so that it can be written in the same transaction as the batch
+    it describes. Values written in a session only reach the cache once that
+    session commits.
+    """
+
+    table_name = '_timeds_checkpoints'
+
+    def __init__(self, engine, scheme, db, dialect_kwargs={}):
+        self.engine = engine
+        self.scheme = scheme
+        self.db = db
+        self.metadata = MetaData()
+        self.table = Table(self.table_name, self.metadata,
+                           Column('scheme', String(191), primary_key=True),
+                           Column('db', String(64), primary_key=True),
+                           Column('table_name', String(64), primary_key=True),
+                           Column('name', String(64), primary_key=True),
+                           Column('value', Text),
+                           **dialect_kwargs)
+        self.cache = None
+        self.lock = th.Lock()
+
+    def _key(self):
+        return and_(self.table.c.scheme == self.scheme, self.table.c.db == self.db)
+
+    def load(self):
+        with self.lock:
+            self.table.create(bind=self.engine, checkfirst=True)
+            rows = self.engine.execute(select([self.table.c.table_name, self.table.c.name, self.table.c.value])
+                                       .where(self._key()))
+            self.cache = {(row.table_name, row.name): row.value for row in rows}
+
+    def get(self, table_name, name=WATERMARK):
+        cache = self.cache
+        if cache is None:
+            self.load()
+            cache = self.cache
+        return cache.get((table_name, name), None)
+
+    def _stage(self, session, change):
+        if self not in session.info:
+            session.info[self] = []
+            event.listen(session, 'after_commit', self._publish)
+            event.listen(session, 'after_rollback', self._discard)
+        session.info[self].append(change)
+
+    def _publish(self, session):
+        changes = session.info.pop(self, [])
+        with self.lock:
+            if self.cache is None:
+                return
+            for table_name, name, value in changes:
+                if value is not None:
+                    self.cache[(table_name, name)] = value
+                    continue
+                for key in list(self.cache):
+                    if key[0] == table_name and (not name or key[1] == name):
+                        del self.cache[key]
+
+    def _discard(self, session):
+        session.info.pop(self, None)
+
+    def set(self, session, table_name, value, name=WATERMARK):
+        """Write a checkpoint inside the caller's session; it is persisted and cached when the session commits"""
+        if self.cache is None:
+            self.load()
+        value = None if value is None else format_value(value)
+        key = and_(self._key(), self.table.c.table_name == table_name, self.table.c.name == name)
+        result = session.execute(self.table.update().where(key).values(value=value))
+        if not result.rowcount:
+            session.execute(self.table.insert().values(
+                scheme=self.scheme, db=self.db, table_name=table_name, name=name, value=value))
+        self._stage(session, (table_name, name, value))
+
+    def delete(self, session, table_name, name=None):
+        if self.cache is None:
+            self.load()
+        key = and_(self._key(), self.table.c.table_name == table_name)
+        if name:
+            key = and_(key, self.table.c.name == name)
+        session.execute(self.table.delete().where(key))
+        self._stage(session, (table_name, name, None))
+
+    def invalidate(self, table_name, name=None):
+        """Reload cached values from the committed checkpoints, e.g. after a failed transaction"""
+        if self.cache is None:
+            return
+        key = and_(self._key(), self.table.c.table_name == table_name)
+        if name:
+            key = and_(key, self.table.c.name == name)
+        try:
+            rows = self.engine.execute(select([self.table.c.name, self.table.c.value]).where(key)).fetchall()
+        except Exception:
+            # reloaded as a whole by the next get
+            with self.lock:
+                self.cache = None
+            return
+
+        with self.lock:
+            if self.cache is None:
+                return
+            for cached in list(self.cache):
+                if cached[0] == table_name and (not name or cached[1] == name):
+                    del self.cache[cached]
+            for row in rows:
+                self.cache[(table_name, row.name)] = row.value
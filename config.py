@@ -32,6 +32,10 @@ host_structure = {
     'username': SchemeProperty('Database user', str, True,),
     'password': SchemeProperty('Database user password', str, True,),
     'execute_first': SchemeProperty('Server bootstrap query', str, False, default=''),
+    'max_concurrency': SchemeProperty('Maximum number of tables replicated at once from/to this server (0 for no limit)', int, False, default=0),
+    'pool_size': SchemeProperty('Connections kept open to this server, shared by all its databases', int, False, default=5),
+    'max_overflow': SchemeProperty('Connections opened beyond pool_size under load', int, False, default=10),
+    'pool_pre_ping': SchemeProperty('Test pooled connections before using them', bool, False, default=False),
 }
 
 db_structure = {
@@ -42,12 +46,53 @@ db_structure = {
     'dynamic_tables': SchemeProperty('No-timestamp tables (recreated on every sync operation)', str, False, default=[],),
     'naming_strategy': SchemeProperty('Target database naming scheme', ['replace', 'exact', 'original'], False, default='original',),
     'order_by': SchemeProperty('SQL Order By Column', str, True, default=''),
+    'interval': SchemeProperty('Replication interval of the tables in seconds (daemon mode)', int, False, default=0),
+    'keyset_pagination': SchemeProperty('Paginate by (order_by, primary key) so that batches never split rows sharing an order_by value', bool, False, default=False),
+    'missing_index': SchemeProperty('What to do with tables without a source index on order_by', ['warn', 'refuse', 'ignore'], False, default='warn'),
+}
+
+adaptive_batching_structure = {
+    'target_duration': SchemeProperty('Target duration of a batch in seconds', int, False, default=10,),
+    'max_bytes': SchemeProperty('Maximum estimated size of a batch in bytes', int, False, default=64 * 1024 * 1024,),
+    'min_batch_size': SchemeProperty('Minimum batch size', int, False, default=1000,),
+    'max_batch_size': SchemeProperty('Maximum batch size', int, False, default=1000000,),
+}
+
+retry_structure = {
+    'attempts': SchemeProperty('Attempts at a batch failing with transient errors before its table is skipped for the cycle', int, False, default=5,),
+    'base_delay': SchemeProperty('Upper bound in seconds of the first random retry delay, doubled on every attempt', int, False, default=1,),
+    'max_delay': SchemeProperty('Maximum retry delay in seconds', int, False, default=60,),
+    'breaker_failures': SchemeProperty('Consecutive transient errors against a server that pause every replicator using it', int, False, default=5,),
+    'probe_interval': SchemeProperty('Seconds between the health probes of a paused server', int, False, default=10,),
 }
 
 root_structure = {
     'source': SchemeProperty('Source server', host_structure, True),
     'target': SchemeProperty('Target server', host_structure, True),
     'batch_size': SchemeProperty('Batch size', int, False, default=100000,),
+    'dynamic_chunk_size': SchemeProperty('Rows streamed and inserted at once into dynamic tables', int, False, default=10000,),
+    'dynamic_intermediate_commits': SchemeProperty('Commit dynamic tables after every chunk', bool, False, default=False,),
+    'dynamic_swap': SchemeProperty('Load dynamic tables into a shadow table and swap it in with RENAME TABLE', bool, False, default=False,),
+    'dynamic_diff': SchemeProperty('Only write the rows of dynamic tables with a primary key that differ, found by range checksums', bool, False, default=False,),
+    'dynamic_diff_rows': SchemeProperty('Rows under which a mismatched key range is compared row by row', int, False, default=1000,),
+    'dynamic_fingerprint': SchemeProperty('Skip dynamic tables whose source fingerprint did not change', ['update_time', 'checksum'], False, default='',),
+    'adaptive_batching': SchemeProperty('Adaptive batch sizing', adaptive_batching_structure, False, default='',),
+    'retry': SchemeProperty('Retry policy of failing batches', retry_structure, False, default='',),
+    'bulk_load': SchemeProperty('Write batches with the target dialect bulk loader (LOAD DATA LOCAL INFILE on MySQL)', bool, False, default=False,),
+    'raw_fetch': SchemeProperty('Read include batches as plain DBAPI tuples and insert them with a precompiled executemany', bool, False, default=False,),
+    'stream_fetch': SchemeProperty('Stream include batches from a server-side cursor, cutting them at batch_bytes', bool, False, default=False,),
+    'batch_bytes': SchemeProperty('Estimated bytes at which a streamed batch is cut short', int, False, default=16 * 1024 * 1024,),
+    'pipeline_depth': SchemeProperty('Number of batches read ahead of the target writer (0 disables pipelining)', int, False, default=0,),
+    'view_workers': SchemeProperty('Views of the same dependency level created at once (0 creates them one by one)', int, False, default=0,),
+    'interval': SchemeProperty('Replication interval of every table in seconds (daemon mode)', int, False, default=0,),
+    'dynamic_interval': SchemeProperty('Replication interval of dynamic tables and views in seconds (daemon mode, 0 disables)', int, False, default=0,),
+    'discovery_interval': SchemeProperty('Interval in seconds between database discoveries and reflections (daemon mode)', int, False, default=600,),
+    'reflection_cache': SchemeProperty('Directory of the reflected table definitions cache', str, False, default='',),
+    'defer_indexes': SchemeProperty('Create new target tables without their secondary indexes and build them once the backfill is done', bool, False, default=False,),
+    'snapshot_workers': SchemeProperty('Number of ranges copied concurrently into an empty target table (0 disables the parallel snapshot)', int, False, default=0,),
+    'skip_idle_tables': SchemeProperty('Skip tables whose information_schema.TABLES activity did not change since their last replication', bool, False, default=False,),
+    'idle_full_check': SchemeProperty('Replicate every table, idle or not, once every this many cycles', int, False, default=10,),
+    'verify_watermark': SchemeProperty('Read the watermark from the target table instead of the checkpoint store', bool, False, default=False,),
     'databases': SchemeProperty('Source and target databases', list, True, child_type=SchemeProperty('database', db_structure, True))
 }
 
@@ -141,6 +186,10 @@ class Config:
                     "driver": "mysql",
                     "username": string,
                     "password": string,
+                    "max_concurrency"?: 0,
+                    "pool_size"?: 5,
+                    "max_overflow"?: 10,
+                    "pool_pre_ping"?: false
                 },
                 "target": {
                     "host": string,
@@ -148,7 +197,11 @@ class Config:
                     "driver": "mysql",
                     "username": string,
                     "password": string,
-                    "execute_first": string
+                    "execute_first": string,
+                    "max_concurrency"?: 0,
+                    "pool_size"?: 5,
+                    "max_overflow"?: 10,
+                    "pool_pre_ping"?: false
                 },
                 "databases": [{
                     "source": regex,
@@ -156,9 +209,46 @@ class Config:
                     "naming_strategy"?: "replace" | "exact" | "original",
                     "exclude_tables"?: regex,
                     "include_tables"?: regex,
-                    "dynamic_tables"?: regex
+                    "dynamic_tables"?: regex,
+                    "interval"?: int,
+                    "keyset_pagination"?: false,
+                    "missing_index"?: "warn" | "refuse" | "ignore"
                 }],
-                "batch_size"?: 100000
+                "batch_size"?: 100000,
+                "adaptive_batching"?: {
+                    "target_duration"?: 10,
+                    "max_bytes"?: 67108864,
+                    "min_batch_size"?: 1000,
+                    "max_batch_size"?: 1000000
+                },
+                "retry"?: {
+                    "attempts"?: 5,
+                    "base_delay"?: 1,
+                    "max_delay"?: 60,
+                    "breaker_failures"?: 5,
+                    "probe_interval"?: 10
+                },
+                "pipeline_depth"?: 0,
+                "snapshot_workers"?: 0,
+                "defer_indexes"?: false,
+                "bulk_load"?: false,
+                "raw_fetch"?: false,
+                "stream_fetch"?: false,
+                "batch_bytes"?: 16777216,
+                "dynamic_chunk_size"?: 10000,
+                "dynamic_intermediate_commits"?: false,
+                "dynamic_swap"?: false,
+                "dynamic_diff"?: false,
+                "dynamic_diff_rows"?: 1000,
+                "dynamic_fingerprint"?: "update_time" | "checksum",
+                "skip_idle_tables"?: false,
+                "idle_full_check"?: 10,
+                "verify_watermark"?: false,
+                "reflection_cache"?: string,
+                "view_workers"?: 0,
+                "interval"?: int,
+                "dynamic_interval"?: 0,
+                "discovery_interval"?: 600
             }
         }
     """
@@ -1,13 +1,22 @@
 # dialect => connector package
 connectors = {
-    'mysql': 'pymysql'
+    'mysql': 'pymysql',
+    # local stand-in (benchmarks): host is a directory holding one <db>.sqlite file per database
+    'sqlite': 'pysqlite',
 }
 
 # dialect => dict(option: value)
 dialect_options = {
     'mysql': {
         'engine': 'InnoDB'
-    }
+    },
+    'sqlite': {},
+}
+
+# dialect => bulk load writer (see writers.py), used when bulk_load is set
+dialect_writers = {
+    'mysql': 'load_data',
+    'sqlite': 'executemany',
 }
 
 supported_dbs = [db for db in connectors.keys()]
@@ -0,0 +1,103 @@
+from keyset import after, until
+from snapshot import interpolate
+from sqlalchemy import select, func, and_, literal, tuple_
+
+FANOUT = 16
+
+
+class ChunkDiff:
+    """
+    Finds the rows of a table that differ between source and target. Ranges of
+    the primary key are compared by row count and BIT_XOR(CRC32(CONCAT_WS(...)))
+    on both sides, and mismatched ranges are split again until they hold at
+    most leaf_rows rows, which are compared row by row. Ranges are bounded by
+    whole key tuples, so that a composite key whose leading column has few
+    values, e.g. (tenant_id, id), is split as finely as any other.
+    """
+
+    def __init__(self, src_table, table, leaf_rows=1000):
+        self.src_table = src_table
+        self.table = table
+        self.leaf_rows = leaf_rows
+        self.key_names = [column.name for column in src_table.primary_key.columns]
+
+    def _columns(self, table):
+        return [table.c[name] for name in self.key_names]
+
+    def _condition(self, table, lower, upper):
+        columns = self._columns(table)
+        if lower is None:
+            return until(columns, upper)
+        return and_(after(columns, lower), until(columns, upper))
+
+    def _checksum(self, table, lower, upper):
+        columns = list(table.columns)
+        # CONCAT_WS skips NULLs, the IS NULL flags tell them apart from empty strings
+        row_hash = func.crc32(func.concat_ws(literal('#'), *(columns + [column.is_(None) for column in columns])))
+        return tuple(select([func.count(), func.coalesce(func.bit_xor(row_hash), 0)])
+                     .where(self._condition(table, lower, upper)).execute().first())
+
+    def _bounds(self, table, lower, upper, low, count):
+        bounds = None
+        if len(self.key_names) == 1:
+            bounds = interpolate(low[0], upper[0], FANOUT)
+            bounds = bounds and [(bound,) for bound in bounds]
+        if not bounds:
+            columns = self._columns(table)
+            bounds = [select(columns).where(self._condition(table, lower, upper)).order_by(*columns)
+                      .limit(1).offset(count * i // FANOUT).execute().first() for i in range(1, FANOUT)]
+            bounds = [tuple(bound) for bound in bounds if bound is not None]
+        return sorted(set(bound for bound in bounds
+                          if low <= bound < upper and (lower is None or bound > lower)))
+
+    def _mismatched(self, lower, upper, low):
+        source = self._checksum(self.src_table, lower, upper)
+        target = self._checksum(self.table, lower, upper)
+        if source == target:
+            return
+
+        count = max(source[0], target[0])
+        bounds = [] if count <= self.leaf_rows else \
+            self._bounds(self.src_table if source[0] >= target[0] else self.table, lower, upper, low, count)
+        if not bounds:
+            yield lower, upper
+            return
+
+        for bound in bounds + [upper]:
+            yield from self._mismatched(lower, bound, low if lower is None else lower)
+            lower = bound
+
+    def mismatched(self):
+        """(lower, upper] ranges of primary key tuples, the first one without a lower bound, that differ"""
+        lows, highs = [], []
+        for table in (self.src_table, self.table):
+            columns = self._columns(table)
+            low = select(columns).order_by(*columns).limit(1).execute().first()
+            high = select(columns).order_by(*(column.desc() for column in columns)).limit(1).execute().first()
+            if high is not None:
+                lows.append(tuple(low))
+                highs.append(tuple(high))
+        if not highs:
+            return iter(())
+        return self._mismatched(None, max(highs), min(lows))
+
+    def key(self, row):
+        return tuple(row[name] for name in self.key_names)
+
+    def _rows(self, table, lower, upper):
+        rows = table.select().where(self._condition(table, lower, upper)).execute().fetchall()
+        return {self.key(row): row for row in rows}
+
+    def diff(self, lower, upper):
+        """Source rows to write and target keys to delete (including those of the rows to write)"""
+        source = self._rows(self.src_table, lower, upper)
+        target = self._rows(self.table, lower, upper)
+        upserts = [row for key, row in source.items() if key not in target or tuple(target[key]) != tuple(row)]
+        deletes = [key for key, row in target.items() if key not in source or tuple(source[key]) != tuple(row)]
+        return upserts, deletes
+
+    def delete(self, keys):
+        columns = self._columns(self.table)
+        if len(columns) == 1:
+            return self.table.delete().where(columns[0].in_([key[0] for key in keys]))
+        return self.table.delete().where(tuple_(*columns).in_(keys))
@@ -0,0 +1,103 @@
+import threading as th
+from collections import deque
+from log import Log
+
+
+class ReplicationPool:
+    """
+    Fixed number of worker threads running replication tasks, e.g. one table
+    of one database. On top of the global limit, every task names the hosts it
+    uses and no more than the host's limit of tasks run against it at once.
+    """
+
+    def __init__(self, workers):
+        self.log = Log()
+        self.limits = {}
+        self.running = {}
+        self.pending = deque()
+        self.active = set()
+        self.unfinished = 0
+        self.closed = False
+        self.cond = th.Condition()
+        self.threads = [th.Thread(target=self._work, name='replicator-%s' % i, daemon=True)
+                        for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def set_limit(self, host, limit):
+        with self.cond:
+            self.limits[host] = limit
+            self.cond.notify_all()
+
+    def submit(self, fn, hosts=(), key=None, **kwargs):
+        """
+        Queues fn, unless a task with the same key is still queued or running.
+        kwargs (e.g. scheme, db) are used when logging a failed task.
+        """
+        with self.cond:
+            if self.closed or (key is not None and key in self.active):
+                return False
+            if key is not None:
+                self.active.add(key)
+            self.pending.append((fn, tuple(hosts), key, kwargs))
+            self.unfinished += 1
+            self.cond.notify_all()
+            return True
+
+    def _runnable(self, hosts):
+        for host in hosts:
+            limit = self.limits.get(host, 0)
+            if limit and self.running.get(host, 0) >= limit:
+                return False
+        return True
+
+    def _take(self):
+        with self.cond:
+            while True:
+                if self.closed:
+                    return None
+                for task in self.pending:
+                    if self._runnable(task[1]):
+                        self.pending.remove(task)
+                        for host in task[1]:
+                            self.running[host] = self.running.get(host, 0) + 1
+                        return task
+                self.cond.wait()
+
+    def _done(self, task):
+        with self.cond:
+            for host in task[1]:
+                self.running[host] -= 1
+            self.active.discard(task[2])
+            self.unfinished -= 1
+            self.cond.notify_all()
+
+    def _work(self):
+        while True:
+            task = self._take()
+            if task is None:
+                return
+            fn, hosts, key, kwargs = task
+            try:
+                fn()
+            except Exception as e:
+                self.log.exception(e, **kwargs)
+            finally:
+                self._done(task)
+
+    def join(self, timeout=None):
+        """Waits until every queued task, including those queued by running tasks, is done"""
+        with self.cond:
+            return self.cond.wait_for(lambda: self.unfinished == 0, timeout=timeout)
+
+    def shutdown(self):
+        """Drops queued tasks and waits for running ones to finish"""
+        with self.cond:
+            self.closed = True
+            self.unfinished -= len(self.pending)
+            for task in self.pending:
+                self.active.discard(task[2])
+            self.pending.clear()
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
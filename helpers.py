@@ -1,9 +1,19 @@
+import os
 import re
-from sqlalchemy import create_engine, inspect
+import threading as th
+from sqlalchemy import create_engine, inspect, text, event, Table, exc
+from sqlalchemy.engine.url import make_url
 from connectors import connectors, dialect_options
 
+# (driver, host, port, username, engine arguments) => engine shared by every database of the server
+shared_engines = {}
+shared_engines_lock = th.Lock()
+
 
 def create_connection_string(driver, host, port, username, password, db=''):
+    if driver == 'sqlite':
+        return '%s+%s:///%s' % (driver, connectors[driver], os.path.join(host, '%s.sqlite' % db if db else ''))
+
     if not db:
         return '%s+%s://%s:%s@%s:%s/INFORMATION_SCHEMA' % (driver, connectors[driver], username, password, host, port)
 
@@ -17,8 +27,63 @@ def get_engine(host_conf, db_name='', **kwargs):
     return create_engine(main_conn_string, **kwargs)
 
 
+def get_database_url(host_conf, db_name):
+    return make_url(create_connection_string(
+        host_conf.driver, host_conf.host, host_conf.port,
+        host_conf.username, host_conf.password, db=db_name))
+
+
+def _use_database(connection, branch):
+    if branch:
+        return
+    db_name = connection.get_execution_options().get('timeds_database', None)
+    # the database a pooled connection was switched to stays with it until the next switch
+    info = connection.connection.info
+    if db_name and info.get('timeds_database', None) != db_name:
+        connection.execute('USE %s' % connection.dialect.identifier_preparer.quote(db_name))
+        info['timeds_database'] = db_name
+
+
+def get_shared_engine(host_conf, db_name='', **kwargs):
+    """
+    Engine of db_name drawing from one connection pool per server and user.
+    Connections are switched to db_name with USE when they are checked out.
+    sqlite databases are separate files and get engines of their own.
+    """
+    if host_conf.driver == 'sqlite':
+        return get_engine(host_conf, db_name, **kwargs)
+
+    key = (host_conf.driver, host_conf.host, host_conf.port, host_conf.username, repr(sorted(kwargs.items())))
+    with shared_engines_lock:
+        engine = shared_engines.get(key, None)
+        if engine is None:
+            engine = get_engine(host_conf, pool_size=host_conf.pool_size, max_overflow=host_conf.max_overflow,
+                                pool_pre_ping=host_conf.pool_pre_ping, **kwargs)
+            event.listen(engine, 'engine_connect', _use_database)
+            shared_engines[key] = engine
+
+    return engine.execution_options(timeds_database=db_name) if db_name else engine
+
+
+def _current_schema(engine):
+    # shared engines default to INFORMATION_SCHEMA, the database has to be named
+    return engine.get_execution_options().get('timeds_database', None)
+
+
+def get_table_names(engine):
+    return inspect(engine).get_table_names(schema=_current_schema(engine))
+
+
+def get_view_names(engine):
+    return inspect(engine).get_view_names(schema=_current_schema(engine))
+
+
 def get_databases_like(engine, regex):
-    schemas = inspect(engine).get_schema_names()
+    if engine.dialect.name == 'sqlite':
+        directory = engine.url.database
+        schemas = sorted(name[:-len('.sqlite')] for name in os.listdir(directory) if name.endswith('.sqlite'))
+    else:
+        schemas = inspect(engine).get_schema_names()
     return [schema for schema in schemas if re.match(regex, schema)]
 
 
@@ -29,3 +94,103 @@ def get_dialect_kwargs(driver):
 
 def get_db_tables(engine, db_name):
     return inspect(engine).get_table_names(schema=db_name)
+
+
+def _fresh_statistics(connection):
+    """
+    MySQL 8 caches the statistics of information_schema.TABLES for
+    information_schema_stats_expiry seconds (a day by default), so TABLE_ROWS,
+    UPDATE_TIME and AUTO_INCREMENT would barely ever change. Older servers and
+    MariaDB have no such cache, nor the variable.
+    """
+    try:
+        connection.execute(text('SET SESSION information_schema_stats_expiry = 0'))
+    except exc.DBAPIError:
+        pass
+
+
+def get_table_fingerprint(engine, db_name, table_name, method='update_time'):
+    if engine.dialect.name != 'mysql':
+        return None
+
+    if method == 'checksum':
+        preparer = engine.dialect.identifier_preparer
+        row = engine.execute('CHECKSUM TABLE %s.%s' % (preparer.quote(db_name), preparer.quote(table_name))).first()
+        return None if row is None or row[1] is None else str(row[1])
+
+    with engine.connect() as connection:
+        _fresh_statistics(connection)
+        row = connection.execute(text('SELECT TABLE_ROWS, UPDATE_TIME FROM information_schema.TABLES '
+                                      'WHERE TABLE_SCHEMA = :db AND TABLE_NAME = :table'), db=db_name, table=table_name).first()
+    # UPDATE_TIME is not persisted by every storage engine, so it can be unknown
+    if row is None or row[1] is None:
+        return None
+    return '%s@%s' % (row[0], row[1])
+
+
+def get_view_definitions(engine, db_name, names):
+    """The SELECT of every named view, in one information_schema.VIEWS query on MySQL"""
+    if engine.dialect.name != 'mysql':
+        inspector = inspect(engine)
+        definitions = {}
+        for name in names:
+            definition = inspector.get_view_definition(name, schema=_current_schema(engine))
+            definitions[name] = definition[definition.lower().index('select'):]
+        return definitions
+
+    rows = engine.execute(text('SELECT TABLE_NAME, VIEW_DEFINITION FROM information_schema.VIEWS '
+                               'WHERE TABLE_SCHEMA = :db'), db=db_name)
+    # columns and tables are qualified with the source database, which is not the target's
+    prefix = engine.dialect.identifier_preparer.quote_identifier(db_name) + '.'
+    names = set(names)
+    # VIEW_DEFINITION is empty without the SHOW VIEW privilege
+    return {row[0]: row[1].replace(prefix, '') for row in rows if row[0] in names and row[1]}
+
+
+def get_table_activity(engine, db_name):
+    """TABLE_ROWS, UPDATE_TIME and AUTO_INCREMENT of every table of the database, in one query"""
+    if engine.dialect.name != 'mysql':
+        return {}
+
+    with engine.connect() as connection:
+        _fresh_statistics(connection)
+        rows = connection.execute(text('SELECT TABLE_NAME, TABLE_ROWS, UPDATE_TIME, AUTO_INCREMENT FROM information_schema.TABLES '
+                                       'WHERE TABLE_SCHEMA = :db AND TABLE_TYPE = \'BASE TABLE\''), db=db_name).fetchall()
+    # without UPDATE_TIME a table cannot be told idle
+    return {row[0]: '%s@%s@%s' % (row[1], row[2], row[3]) for row in rows if row[2] is not None}
+
+
+def get_column_fingerprints(engine, db_name):
+    if engine.dialect.name != 'mysql':
+        return {}
+
+    rows = engine.execute(text('SELECT TABLE_NAME, COUNT(*), SUM(CRC32(CONCAT_WS(\'|\', COLUMN_NAME, ORDINAL_POSITION, '
+                               'COLUMN_TYPE, IS_NULLABLE, COLUMN_DEFAULT, COLUMN_KEY, EXTRA, COLLATION_NAME))) '
+                               'FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = :db GROUP BY TABLE_NAME'), db=db_name)
+    return {row[0]: '%s:%s' % (row[1], row[2]) for row in rows}
+
+
+def reflect_tables(metadata, names, views=False, **kwargs):
+    """Reflects the named tables (and views) one by one, skipping those that no longer exist"""
+    names = [name for name in names if name not in metadata.tables]
+    if not names:
+        return
+
+    with metadata.bind.connect() as connection:
+        for name in names:
+            try:
+                Table(name, metadata, autoload=True, autoload_with=connection, **kwargs)
+            except exc.NoSuchTableError:
+                continue
+
+
+def rename_tables(engine, renames):
+    """Renames (old, new) pairs at once: atomically with RENAME TABLE on MySQL, in one transaction elsewhere"""
+    quote = engine.dialect.identifier_preparer.quote
+    if engine.dialect.name == 'mysql':
+        engine.execute('RENAME TABLE %s' % ', '.join('%s TO %s' % (quote(old), quote(new)) for old, new in renames))
+        return
+
+    with engine.begin() as connection:
+        for old, new in renames:
+            connection.execute('ALTER TABLE %s RENAME TO %s' % (quote(old), quote(new)))
@@ -0,0 +1,37 @@
+import time
+from contextlib import contextmanager
+
+
+class Hooks:
+    """
+    Callbacks run when a named replication phase (reflect, watermark, read,
+    convert, write, commit, ...) starts and ends. Both get the phase name and
+    a dict with the scheme, db and table; on end it also holds start,
+    duration and, for phases moving rows, rows.
+    """
+
+    def __init__(self):
+        self.on_start = []
+        self.on_end = []
+
+    def add(self, on_start=None, on_end=None):
+        if on_start:
+            self.on_start.append(on_start)
+        if on_end:
+            self.on_end.append(on_end)
+
+    @contextmanager
+    def phase(self, name, **info):
+        if not self.on_start and not self.on_end:
+            yield info
+            return
+
+        info['start'] = time.time()
+        for callback in self.on_start:
+            callback(name, info)
+        try:
+            yield info
+        finally:
+            info['duration'] = time.time() - info['start']
+            for callback in self.on_end:
+                callback(name, info)
@@ -0,0 +1,59 @@
+import json
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateIndex
+
+
+def deferred_indexes(table, order_by):
+    """
+    Secondary indexes of a table that can wait until its backfill is done:
+    all of them but one starting with order_by, which the watermark is read by
+    """
+    primary_key = list(table.primary_key.columns)
+    kept = primary_key and primary_key[0].name == order_by
+    deferred = []
+    for index in sorted(table.indexes, key=lambda index: index.name or ''):
+        columns = list(index.columns)
+        if not kept and columns and columns[0].name == order_by:
+            kept = True
+            continue
+        deferred.append(index)
+    return deferred
+
+
+def encode_indexes(indexes):
+    return json.dumps([index.name for index in indexes])
+
+
+def decode_indexes(table, encoded):
+    names = json.loads(encoded)
+    return [index for index in table.indexes if index.name in names]
+
+
+def _add_index_clause(index, dialect):
+    # CREATE [UNIQUE|FULLTEXT...] INDEX name ON table (columns) [USING ...]
+    create = str(CreateIndex(index).compile(dialect=dialect))
+    kind, rest = create.split(' INDEX ', 1)
+    name, columns = rest.split(' ON %s ' % dialect.identifier_preparer.format_table(index.table), 1)
+    return 'ADD %s %s %s' % ((kind[len('CREATE'):] + ' INDEX').strip(), name, columns)
+
+
+def build_indexes(engine, table_name, indexes):
+    """
+    Builds the indexes of a target table left out while it was backfilled.
+    MySQL builds them together with a single online ALTER TABLE, other
+    dialects one CREATE INDEX at a time. Indexes that already exist are
+    skipped, so a failed build can simply be run again.
+    """
+    existing = {index['name'] for index in inspect(engine).get_indexes(table_name)}
+    indexes = [index for index in indexes if index.name not in existing]
+    if not indexes:
+        return 0
+
+    if engine.dialect.name == 'mysql':
+        preparer = engine.dialect.identifier_preparer
+        engine.execute(text('ALTER TABLE %s %s' % (
+            preparer.quote(table_name), ', '.join(_add_index_clause(index, engine.dialect) for index in indexes))))
+    else:
+        for index in indexes:
+            engine.execute(CreateIndex(index))
+    return len(indexes)
@@ -0,0 +1,60 @@
+import json
+from checkpoint import format_value, parse_value
+from sqlalchemy import and_, or_, not_
+
+
+def cursor_names(table, order_by, with_primary_key=False):
+    """Columns a table is paginated by: order_by, then the primary key columns when requested"""
+    names = [order_by]
+    if with_primary_key:
+        names.extend([column.name for column in table.primary_key.columns if column.name != order_by])
+    return names
+
+
+def _after(columns, values):
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return or_(columns[0] > values[0], and_(columns[0] == values[0], _after(columns[1:], values[1:])))
+
+
+def after(columns, values):
+    """
+    (columns) > (values), spelled out so that the leading column bounds an
+    index range scan
+    """
+    if len(columns) == 1:
+        return columns[0] > values[0]
+    return and_(columns[0] >= values[0], _after(columns, values))
+
+
+def until(columns, values):
+    """(columns) <= (values), the leading column bounding the index range scan as in after"""
+    if len(columns) == 1:
+        return columns[0] <= values[0]
+    return and_(columns[0] <= values[0], not_(_after(columns, values)))
+
+
+def encode_cursor(values):
+    return json.dumps([format_value(value) for value in values])
+
+
+def decode_cursor(columns, encoded):
+    return tuple(parse_value(column.type, value) for column, value in zip(columns, json.loads(encoded)))
+
+
+def format_cursor(values):
+    if values is None:
+        return None
+    return values[0] if len(values) == 1 else values
+
+
+def has_index_on(table, column_name):
+    """True when an index (or the primary key) of the reflected table starts with the column"""
+    primary_key = list(table.primary_key.columns)
+    if primary_key and primary_key[0].name == column_name:
+        return True
+    for index in table.indexes:
+        columns = list(index.columns)
+        if columns and columns[0].name == column_name:
+            return True
+    return False
@@ -1,6 +1,7 @@
 import config as conf
 import logging as log
 import sys
+from metrics import metrics
 
 
 # class LazyStreamHandler(log.StreamHandler):
@@ -37,26 +38,100 @@ class Log:
         log.error(msg, extra=self._construct_params(kwargs))
 
     def exception(self, e, **kwargs):
+        metrics.inc('timeds_errors_total', type=type(e).__name__, **self._construct_params(kwargs))
         log.exception(e, extra=self._construct_params(kwargs))
 
     def batch_dynamic(self, count, time, table_name, **kwargs):
-        log.info('%s record(s) were inserted into the dynamic table %s in %s sec' % (
-            count, table_name, int(time)), extra=self._construct_params(kwargs))
+        rate = count / time if time else count
+        metrics.inc('timeds_rows_total', count, table=table_name, kind='dynamic', **self._construct_params(kwargs))
+        log.info('%s record(s) were inserted into the dynamic table %s in %.2f sec (%d rows/sec)' % (
+            count, table_name, time, rate), extra=self._construct_params(kwargs))
 
     def batch_include(self, batch_nb, count, table_name, latest, time, read_time, write_time, **kwargs):
-        log.info('Batch #%s: %s records were inserted into [%s] at %s. Total: %s sec (read=%s, write=%s)' % (
-            batch_nb, count, table_name, latest, int(time), int(read_time), int(write_time)), extra=self._construct_params(kwargs))
+        params = self._construct_params(kwargs)
+        metrics.inc('timeds_rows_total', count, table=table_name, kind='include', **params)
+        metrics.observe('timeds_batch_seconds', time, table=table_name, **params)
+        metrics.observe('timeds_batch_read_seconds', read_time, table=table_name, **params)
+        metrics.observe('timeds_batch_write_seconds', write_time, table=table_name, **params)
+        log.info('Batch #%s: %s records were inserted into [%s] at %s. Total: %.2f sec (read=%.2f, write=%.2f)' % (
+            batch_nb, count, table_name, latest, time, read_time, write_time), extra=params)
+
+    def missing_index(self, table_name, column, refused, **kwargs):
+        msg = 'No source index starts with %s, batches of %s are full scans' % (column, table_name)
+        if refused:
+            log.error(msg + ', skipping the table', extra=self._construct_params(kwargs))
+        else:
+            log.warning(msg, extra=self._construct_params(kwargs))
+
+    def snapshot_planned(self, table_name, ranges, **kwargs):
+        log.info('Empty target table %s, copying it in %s ranges' %
+                 (table_name, ranges), extra=self._construct_params(kwargs))
+
+    def snapshot_done(self, table_name, time, **kwargs):
+        log.info('Snapshot of %s finished in %.2f sec, switching to incremental replication' %
+                 (table_name, time), extra=self._construct_params(kwargs))
+
+    def indexes_deferred(self, table_name, count, **kwargs):
+        log.info('Created %s without %s secondary index(es), they are built once its backfill is done' %
+                 (table_name, count), extra=self._construct_params(kwargs))
+
+    def indexes_built(self, table_name, count, time, **kwargs):
+        log.info('%s deferred index(es) of %s were built in %.2f sec' %
+                 (count, table_name, time), extra=self._construct_params(kwargs))
+
+    def idle_tables(self, idle, total, **kwargs):
+        log.info('%s of %s table(s) are idle, skipping them' %
+                 (idle, total), extra=self._construct_params(kwargs))
+
+    def batch_retry(self, table_name, attempt, delay, **kwargs):
+        log.warning('Attempt #%s at a batch of %s failed, retrying in %.1f sec' %
+                    (attempt, table_name, delay), extra=self._construct_params(kwargs))
+
+    def table_skipped(self, table_name, attempts, **kwargs):
+        log.error('Giving up on %s after %s failed attempt(s), skipping it for this cycle' %
+                  (table_name, attempts), extra=self._construct_params(kwargs))
+
+    def host_down(self, role, host, interval, **kwargs):
+        log.error('Too many errors against the %s server %s, pausing its replicators and probing it every %s sec' %
+                  (role, host, interval), extra=self._construct_params(kwargs))
+
+    def host_recovered(self, role, host, **kwargs):
+        log.info('The %s server %s answered its health probe, resuming replication' %
+                 (role, host), extra=self._construct_params(kwargs))
+
+    def worker_exited(self, index, exitcode, restarting, **kwargs):
+        log.error('Worker process %s exited with code %s%s' % (
+            index, exitcode, ', restarting it' if restarting else ''), extra=self._construct_params(kwargs))
 
     def database_created(self, **kwargs):
         log.info('Database was created', extra=self._construct_params(kwargs))
 
-    def view_created(self, view_name, **kwargs):
-        log.info('View %s was created', extra=self._construct_params(kwargs))
+    def view_created(self, view_name, time, **kwargs):
+        metrics.observe('timeds_view_seconds', time, table=view_name, **self._construct_params(kwargs))
+        log.info('View %s was created in %.2f sec' %
+                 (view_name, time), extra=self._construct_params(kwargs))
+
+    def view_skipped(self, view_name, **kwargs):
+        log.warning('View %s depends on a view that could not be created, skipping' %
+                    (view_name), extra=self._construct_params(kwargs))
 
     def dynamic_recreated(self, table_name, **kwargs):
         log.info('(re)creating dynamic table %s' %
                  (table_name), extra=self._construct_params(kwargs))
 
+    def dynamic_unchanged(self, table_name, **kwargs):
+        log.info('Dynamic table %s is unchanged, skipping' %
+                 (table_name), extra=self._construct_params(kwargs))
+
+    def dynamic_diffed(self, table_name, written, deleted, time, **kwargs):
+        metrics.inc('timeds_rows_total', written, table=table_name, kind='dynamic', **self._construct_params(kwargs))
+        log.info('Dynamic table %s synced in %.2f sec: %s row(s) written, %s deleted' %
+                 (table_name, time, written, deleted), extra=self._construct_params(kwargs))
+
+    def dynamic_swapped(self, table_name, **kwargs):
+        log.info('Swapped in the new copy of dynamic table %s' %
+                 (table_name), extra=self._construct_params(kwargs))
+
     def reflecting_source(self, **kwargs):
         log.info('Reflecting source database',
                  extra=self._construct_params(kwargs))
@@ -0,0 +1,179 @@
+import os
+import threading as th
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, float('inf'))
+
+HELP = {
+    'timeds_rows_total': ('counter', 'Rows replicated'),
+    'timeds_bytes_total': ('counter', 'Estimated bytes replicated'),
+    'timeds_batch_seconds': ('histogram', 'Total time of a batch'),
+    'timeds_batch_read_seconds': ('histogram', 'Time spent reading a batch from the source'),
+    'timeds_batch_write_seconds': ('histogram', 'Time spent writing and committing a batch to the target'),
+    'timeds_dynamic_chunk_seconds': ('histogram', 'Time to copy or sync a chunk of a dynamic table'),
+    'timeds_view_seconds': ('histogram', 'Time to create or replace a view'),
+    'timeds_replication_lag': ('gauge', 'Source max(order_by) minus target watermark, in seconds for temporal columns'),
+    'timeds_reflection_seconds': ('gauge', 'Duration of the last reflection'),
+    'timeds_errors_total': ('counter', 'Errors by exception type'),
+}
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (key, _escape(value)) for key, value in pairs)
+
+
+class Metrics:
+    """
+    Process-wide registry of replication metrics, rendered in the Prometheus
+    text exposition format.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        # raw observations are only kept on request, e.g. for benchmark percentiles
+        self.keep_samples = False
+        self.lock = th.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.gauges = {}
+            self.histograms = {}
+            self.samples = {}
+            self.remote = {}
+
+    def _key(self, name, labels):
+        return name, tuple(sorted((key, value or '') for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key, None)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * len(BUCKETS), 0, 0.0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += 1
+            histogram[2] += value
+            if self.keep_samples:
+                self.samples.setdefault(name, []).append(value)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': dict(self.counters),
+                'gauges': dict(self.gauges),
+                'histograms': {key: [list(buckets), count, total]
+                               for key, (buckets, count, total) in self.histograms.items()},
+            }
+
+    def merge(self, source, snapshot):
+        """Keeps the latest snapshot of another process (a --processes worker) to report along with this one"""
+        with self.lock:
+            self.remote[source] = snapshot
+
+    def _combined(self):
+        counters = dict(self.counters)
+        gauges = dict(self.gauges)
+        histograms = {key: [list(buckets), count, total] for key, (buckets, count, total) in self.histograms.items()}
+        for snapshot in self.remote.values():
+            for key, value in snapshot['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            gauges.update(snapshot['gauges'])
+            for key, (buckets, count, total) in snapshot['histograms'].items():
+                histogram = histograms.setdefault(key, [[0] * len(BUCKETS), 0, 0.0])
+                histogram[0] = [mine + theirs for mine, theirs in zip(histogram[0], buckets)]
+                histogram[1] += count
+                histogram[2] += total
+        return counters, gauges, histograms
+
+    def total(self, name):
+        """Sum of a counter or gauge over all its label sets"""
+        with self.lock:
+            counters, gauges, _ = self._combined()
+        return sum(value for (key, _), value in list(counters.items()) + list(gauges.items()) if key == name)
+
+    def render(self):
+        with self.lock:
+            counters, gauges, histograms = self._combined()
+            samples = {}
+            for (name, labels), value in list(counters.items()) + list(gauges.items()):
+                samples.setdefault(name, []).append('%s%s %s' % (name, _labels(labels), value))
+            for (name, labels), (buckets, count, total) in histograms.items():
+                lines = samples.setdefault(name, [])
+                for bound, bucket in zip(BUCKETS, buckets):
+                    le = '+Inf' if bound == float('inf') else bound
+                    lines.append('%s_bucket%s %s' % (name, _labels(labels, [('le', le)]), bucket))
+                lines.append('%s_count%s %s' % (name, _labels(labels), count))
+                lines.append('%s_sum%s %s' % (name, _labels(labels), total))
+
+        output = []
+        for name in sorted(samples):
+            metric_type, description = HELP.get(name, ('untyped', name))
+            output.append('# HELP %s %s' % (name, description))
+            output.append('# TYPE %s %s' % (name, metric_type))
+            output.extend(samples[name])
+        return '\n'.join(output) + '\n'
+
+    def serve(self, port, host=''):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        class Server(ThreadingMixIn, HTTPServer):
+            daemon_threads = True
+
+        self.enabled = True
+        server = Server((host, port), Handler)
+        th.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+        return server
+
+    def write_textfile(self, path):
+        with open(path + '.tmp', 'w') as textfile:
+            textfile.write(self.render())
+        os.replace(path + '.tmp', path)
+
+    def write_periodically(self, path, interval, stopped):
+        """Writes the textfile every interval seconds until stopped is set, and once more at the end"""
+        self.enabled = True
+
+        def write():
+            while not stopped.wait(interval):
+                self.write_textfile(path)
+            self.write_textfile(path)
+
+        thread = th.Thread(target=write, name='metrics-textfile', daemon=True)
+        thread.start()
+        return thread
+
+
+metrics = Metrics()
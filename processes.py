@@ -0,0 +1,129 @@
+import logging
+import multiprocessing as mp
+import os
+import signal
+import threading as th
+import time
+import zlib
+from logging.handlers import QueueHandler
+import config as conf
+from hooks import Hooks
+from log import Log
+from metrics import metrics
+from profiling import Profiler
+
+RESTART_DELAY = 10
+METRICS_INTERVAL = 5
+
+
+def shard_of(db, count):
+    """Worker process of a database, stable across runs"""
+    return zlib.crc32(db.encode('utf-8')) % count
+
+
+def _report_metrics(index, queue, stopped):
+    while not stopped.wait(METRICS_INTERVAL):
+        queue.put((index, metrics.snapshot()))
+    queue.put((index, metrics.snapshot()))
+
+
+def _watch_parent(parent, stopped):
+    # orphaned workers stop instead of replicating on their own
+    while not stopped.wait(1):
+        if os.getppid() != parent:
+            stopped.set()
+
+
+def _worker(replicate, args, index, count, queue, parent):
+    # records are formatted by the parent
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(queue)]
+    root.setLevel(logging.INFO)
+
+    stopped = th.Event()
+    th.Thread(target=_watch_parent, args=(parent, stopped), name='parent-watch', daemon=True).start()
+    hooks = Hooks()
+    profiler = None
+    reporter = None
+    if args.profile:
+        profiler = Profiler(os.path.join(args.profile, 'worker-%s' % index))
+        profiler.start(hooks)
+    if args.metrics_port or args.metrics_file:
+        metrics.enabled = True
+        reporter = th.Thread(target=_report_metrics, args=(index, queue, stopped), name='metrics', daemon=True)
+        reporter.start()
+
+    try:
+        replicate(conf.Config(args.config), args, Log(), stopped, hooks, shard=(index, count))
+    finally:
+        stopped.set()
+        if reporter:
+            reporter.join()
+        if profiler:
+            profiler.stop()
+
+
+def _collect(queue):
+    while True:
+        item = queue.get()
+        if item is None:
+            return
+        if isinstance(item, logging.LogRecord):
+            logging.getLogger(item.name).handle(item)
+        else:
+            metrics.merge(*item)
+
+
+def _start(replicate, args, index, queue):
+    process = mp.Process(target=_worker, args=(replicate, args, index, args.processes, queue, os.getpid()),
+                         name='timeds-worker-%s' % index, daemon=False)
+    process.start()
+    return process
+
+
+def run_processes(replicate, args, log, stopped):
+    """
+    Shards the databases over args.processes worker processes, each with its
+    own pool and engines, by a stable hash of their name. Logs and metrics of
+    the workers are funneled back to this process. A worker that dies does not
+    take the others down, and is restarted in daemon mode.
+    """
+    if args.daemon:
+        signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+        signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+
+    queue = mp.Queue()
+    collector = th.Thread(target=_collect, args=(queue,), name='worker-logs', daemon=True)
+    collector.start()
+
+    processes = {index: _start(replicate, args, index, queue) for index in range(args.processes)}
+    log.info('Started %s worker processes' % (args.processes))
+    restarts = {}
+    terminated = False
+    while processes or (restarts and not stopped.is_set()):
+        if stopped.is_set() and not terminated:
+            # workers stop gracefully on SIGTERM, like a daemon
+            for process in processes.values():
+                process.terminate()
+            terminated = True
+
+        for index, process in list(processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del processes[index]
+            restart = args.daemon and not stopped.is_set()
+            if process.exitcode or restart:
+                log.worker_exited(index, process.exitcode, restart)
+            if restart:
+                restarts[index] = time.time() + RESTART_DELAY
+
+        for index, restart_at in list(restarts.items()):
+            if not stopped.is_set() and time.time() >= restart_at:
+                del restarts[index]
+                processes[index] = _start(replicate, args, index, queue)
+
+        time.sleep(0.5)
+
+    queue.put(None)
+    collector.join()
@@ -0,0 +1,82 @@
+import cProfile
+import json
+import os
+import sys
+import threading as th
+
+
+class Profiler:
+    """
+    Profiling of a whole run (--profile): one cProfile dump per thread, and the
+    phases reported through the replication hooks as a Chrome trace
+    (chrome://tracing, Perfetto) and a per-phase summary.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.lock = th.Lock()
+        self.profiles = {}
+        self.events = []
+
+    def _enable(self):
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ only lets one cProfile run at a time
+            return
+        thread = th.current_thread()
+        with self.lock:
+            self.profiles['%s-%s' % (thread.name, thread.ident)] = profile
+
+    def _start_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        self._enable()
+
+    def _record(self, name, info):
+        event = {
+            'name': name,
+            'cat': 'timeds',
+            'ph': 'X',
+            'ts': int(info['start'] * 1e6),
+            'dur': int(info['duration'] * 1e6),
+            'pid': os.getpid(),
+            'tid': th.get_ident(),
+            'args': {key: value for key, value in info.items() if key not in ('start', 'duration') and value is not None},
+        }
+        with self.lock:
+            self.events.append(event)
+
+    def start(self, hooks):
+        """Profiles the calling thread and every thread started from now on"""
+        hooks.add(on_end=self._record)
+        th.setprofile(self._start_thread)
+        self._enable()
+
+    def summary(self):
+        phases = {}
+        with self.lock:
+            events = list(self.events)
+        for event in events:
+            phase = phases.setdefault(event['name'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0})
+            seconds = event['dur'] / 1e6
+            phase['count'] += 1
+            phase['seconds'] += seconds
+            phase['max_seconds'] = max(phase['max_seconds'], seconds)
+            phase['rows'] += event['args'].get('rows', 0)
+        return phases
+
+    def stop(self):
+        th.setprofile(None)
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock:
+            profiles = dict(self.profiles)
+            events = list(self.events)
+
+        for name, profile in profiles.items():
+            profile.disable()
+            profile.dump_stats(os.path.join(self.directory, '%s.prof' % name))
+        with open(os.path.join(self.directory, 'trace.json'), 'w') as trace:
+            json.dump({'traceEvents': events}, trace, default=str)
+        with open(os.path.join(self.directory, 'summary.json'), 'w') as summary:
+            json.dump(self.summary(), summary, indent=2, sort_keys=True)
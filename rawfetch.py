@@ -0,0 +1,45 @@
+class RawFetch:
+    """
+    Reads batches of a table as the plain tuples of the DBAPI cursor, without
+    SQLAlchemy result processing. Rows are handed to the target as they are
+    when both ends use the same dialect, and only the columns whose type
+    processing differs are converted otherwise.
+    """
+
+    def __init__(self, src_table, table, src_dialect, trg_dialect, cursor_names):
+        # rows come in the order of the source columns, whatever the order of the target's
+        self.names = [column.name for column in src_table.columns]
+        readers = [column.type.dialect_impl(src_dialect).result_processor(src_dialect, None)
+                   for column in src_table.columns]
+        self.cursor_columns = [(self.names.index(name), readers[self.names.index(name)]) for name in cursor_names]
+
+        self.processors = []
+        if src_dialect.name != trg_dialect.name:
+            writers = [table.c[name].type.dialect_impl(trg_dialect).bind_processor(trg_dialect)
+                       if name in table.c else None for name in self.names]
+            self.processors = [(i, reader, writer) for i, (reader, writer) in enumerate(zip(readers, writers))
+                               if reader is not None or writer is not None]
+
+    def fetch(self, connection, query):
+        result = connection.execute(query)
+        try:
+            return list(result.cursor.fetchall())
+        finally:
+            result.close()
+
+    def cursor(self, row):
+        """Python values of the pagination columns of a raw row"""
+        return tuple(row[i] if reader is None else reader(row[i]) for i, reader in self.cursor_columns)
+
+    def for_target(self, rows):
+        if not self.processors:
+            return rows
+
+        converted = []
+        for row in rows:
+            row = list(row)
+            for i, reader, writer in self.processors:
+                value = row[i] if reader is None else reader(row[i])
+                row[i] = value if writer is None else writer(value)
+            converted.append(tuple(row))
+        return converted
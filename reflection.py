@@ -0,0 +1,60 @@
+import os
+import pickle
+from helpers import get_column_fingerprints, reflect_tables
+
+
+class ReflectionCache:
+    """
+    Reflected table definitions pickled to disk. A cached table is reused as
+    long as the fingerprint of its information_schema.COLUMNS rows is
+    unchanged, and only the other tables are reflected again.
+    """
+
+    def __init__(self, directory, scheme):
+        self.directory = directory
+        self.scheme = scheme
+
+    def _path(self, role, db):
+        return os.path.join(self.directory, '%s-%s-%s.pickle' % (self.scheme, role, db))
+
+    def _load(self, role, db):
+        try:
+            with open(self._path(role, db), 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except Exception:
+            return {'fingerprints': {}, 'tables': {}}
+
+    def _save(self, role, db, cached):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(role, db)
+        with open(path + '.tmp', 'wb') as cache_file:
+            pickle.dump(cached, cache_file)
+        os.replace(path + '.tmp', path)
+
+    def reflect(self, metadata, engine, db, role, names, **kwargs):
+        """Fills metadata with the given tables and returns the names that had to be reflected"""
+        fingerprints = get_column_fingerprints(engine, db)
+        cached = self._load(role, db)
+
+        stale = []
+        for name in names:
+            fingerprint = fingerprints.get(name, None)
+            if fingerprint is not None and cached['fingerprints'].get(name, None) == fingerprint \
+                    and name in cached['tables'] and name not in metadata.tables:
+                cached['tables'][name].tometadata(metadata)
+            elif name not in metadata.tables:
+                stale.append(name)
+
+        reflect_tables(metadata, stale, **kwargs)
+
+        # keep the entries of tables that were not requested this time (e.g. views) while they exist
+        for name in list(cached['tables']):
+            if name not in fingerprints:
+                cached['fingerprints'].pop(name, None)
+                cached['tables'].pop(name, None)
+        for name in names:
+            if name in fingerprints and name in metadata.tables:
+                cached['fingerprints'][name] = fingerprints[name]
+                cached['tables'][name] = metadata.tables[name]
+        self._save(role, db, cached)
+        return stale
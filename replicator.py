@@ -1,19 +1,47 @@
+import hashlib
+import queue
 import re
 import threading as th
 import time
-from helpers import get_engine, get_databases_like, get_dialect_kwargs
+from concurrent.futures import ThreadPoolExecutor
+from batching import get_batch_size, estimate_bytes, fetch_bounded
+from budget import memory_budget
+from checkpoint import CheckpointStore, WATERMARK, FINGERPRINT, BATCH_SIZE, CURSOR, SNAPSHOT, ACTIVITY, CYCLE, \
+    VIEW, INDEXES, parse_value
+from connectors import dialect_writers
+from diffsync import ChunkDiff
+from hooks import Hooks
+from indexes import deferred_indexes, encode_indexes, decode_indexes, build_indexes
+from helpers import get_shared_engine, get_database_url, get_databases_like, get_dialect_kwargs, get_table_fingerprint, \
+    get_table_activity, get_table_names, get_view_names, get_view_definitions, reflect_tables, rename_tables
+from keyset import cursor_names, after, encode_cursor, decode_cursor, format_cursor, has_index_on
 from log import Log
-from sqlalchemy import MetaData, inspect, text, exc, select
+from metrics import metrics
+from processes import shard_of
+from rawfetch import RawFetch
+from reflection import ReflectionCache
+from retry import get_retry_policy, get_breaker, is_transient, is_connection_error
+from scheduler import Schedule
+from snapshot import plan_ranges, encode_ranges, decode_ranges
+from views import view_dependencies, view_levels
+from writers import get_writer
+from sqlalchemy import MetaData, text, exc, select, func, and_
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy_utils import database_exists, create_database
-from sqlalchemy_views import CreateView
+from sqlalchemy_views import CreateView, DropView
 
 
-class DbReplicator(th.Thread):
+class DbReplicator:
     def __init__(self, scheme, config, src_db, trg_db, only_dynamic_and_views=False,
-                 include_tables=[], exclude_tables=[], dynamic_tables=[], order_by='',):
-        super().__init__()
+                 include_tables=[], exclude_tables=[], dynamic_tables=[], order_by='', scheduled=False, interval=0,
+                 keyset_pagination=False, missing_index='warn', hooks=None):
         self.only_dynamic_and_views = only_dynamic_and_views
+        self.scheduled = scheduled
+        self.interval = interval
+        self.stopped = th.Event()
+        self.lock = th.Lock()
+        self.schedule = Schedule()
+        self.next_prepare = 0
         self.scheme = scheme
         self.log = Log()
         self.scheme_conf = config
@@ -23,37 +51,103 @@ class DbReplicator(th.Thread):
         self.exclude_tables = exclude_tables
         self.dynamic_tables = dynamic_tables
         self.order_by = order_by
+        self.keyset_pagination = keyset_pagination
+        self.missing_index = missing_index
+        self.hooks = hooks or Hooks()
 
-        self.src_engine = get_engine(
+        writer = 'executemany'
+        trg_kwargs = {}
+        if self.scheme_conf.bulk_load:
+            writer = dialect_writers[self.scheme_conf.target.driver]
+        if writer == 'load_data':
+            trg_kwargs['connect_args'] = {'local_infile': True}
+        self.writer = get_writer(writer)
+
+        self.src_engine = get_shared_engine(
             self.scheme_conf.source, self.src_db, pool_recycle=7200)
-        self.trg_engine = get_engine(
-            self.scheme_conf.target, self.trg_db, pool_recycle=7200)
+        self.trg_engine = get_shared_engine(
+            self.scheme_conf.target, self.trg_db, pool_recycle=7200, **trg_kwargs)
+        self.trg_url = get_database_url(self.scheme_conf.target, self.trg_db)
         self.TargetSession = sessionmaker(bind=self.trg_engine)
         self.dialect_kwargs = get_dialect_kwargs(
             self.scheme_conf.target.driver)
 
-        if not database_exists(self.trg_engine.url):
-            create_database(self.trg_engine.url)
-            self.log.database_created(scheme=self.scheme, db=self.trg_db)
+        self.hosts = (
+            ('source', '%s:%s' % (self.scheme_conf.source.host, self.scheme_conf.source.port)),
+            ('target', '%s:%s' % (self.scheme_conf.target.host, self.scheme_conf.target.port)),
+        )
+
+        self.src_metadata = None
+        self.trg_metadata = None
+        self.include = []
+        self.dynamic = []
+        self.views = []
+        self.created = set()
+        self.batch_sizes = {}
+        self.raw = {}
+        self.fitted = {}
+        # last measured source max(order_by) of every table, reused while the table is idle
+        self.source_max = {}
+        self.retry = get_retry_policy(self.scheme_conf)
+        self.reflection_cache = None
+        if self.scheme_conf.reflection_cache:
+            self.reflection_cache = ReflectionCache(self.scheme_conf.reflection_cache, self.scheme)
+        self.checkpoints = CheckpointStore(
+            self.trg_engine, self.scheme, self.trg_db, dialect_kwargs=self.dialect_kwargs)
+
+    def _phase(self, name, table=None, **info):
+        return self.hooks.phase(name, scheme=self.scheme, db=self.trg_db, table=table, **info)
+
+    def _wait_hosts(self):
+        """Waits while the circuit breaker of the source or target server is open"""
+        for (role, host), engine in zip(self.hosts, (self.src_engine, self.trg_engine)):
+            if get_breaker(host).wait(engine, self.retry.probe_interval, self.stopped):
+                self.log.host_recovered(role, host, scheme=self.scheme, db=self.trg_db)
+
+    def _batch_succeeded(self):
+        for _, host in self.hosts:
+            get_breaker(host).success()
+
+    def _batch_failed(self, e, table_name, role, attempt):
+        """
+        Logs the error of a batch read from the source or written to the target
+        and backs off. Returns False when the table is skipped for this cycle.
+        """
+        self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+        transient = is_transient(e)
+        # lock waits and deadlocks say nothing about the health of the server
+        if is_connection_error(e):
+            host = dict(self.hosts)[role]
+            if get_breaker(host).failure(self.retry.breaker_failures):
+                self.log.host_down(role, host, self.retry.probe_interval, scheme=self.scheme, db=self.trg_db)
+
+        if not transient or attempt >= self.retry.attempts:
+            self.log.table_skipped(table_name, attempt, scheme=self.scheme, db=self.trg_db)
+            return False
+
+        delay = self.retry.delay(attempt)
+        self.log.batch_retry(table_name, attempt, delay, scheme=self.scheme, db=self.trg_db)
+        self.stopped.wait(delay)
+        return True
 
     def _to_target_table(self, target_metadata, src_table):
-        if src_table.name in target_metadata.tables:
-            return target_metadata.tables[src_table.name]
+        with self.lock:
+            if src_table.name in target_metadata.tables:
+                return target_metadata.tables[src_table.name]
 
-        table = src_table.tometadata(target_metadata)
-        for key, value in self.dialect_kwargs.items():
-            table.dialect_kwargs[key] = value
+            table = src_table.tometadata(target_metadata)
+            for key, value in self.dialect_kwargs.items():
+                table.dialect_kwargs[key] = value
 
-        return table
+            return table
 
     def _run_transaction(self, session, stmt, stmt_params=None):
         try:
             session.execute(stmt, stmt_params)
+            session.commit()
         except Exception as e:
             session.rollback()
             raise e
-        else:
-            session.commit()
         finally:
             session.close()
 
@@ -61,147 +155,1026 @@ class DbReplicator(th.Thread):
         session = self.TargetSession()
         self._run_transaction(session, stmt, stmt_params=stmt_params)
 
+    def _create_view(self, target_metadata, src_view, definition, exists):
+        with self._phase('view', src_view.name):
+            return self._replace_view(target_metadata, src_view, definition, exists)
+
+    def _replace_view(self, target_metadata, src_view, definition, exists):
+        trg_view = self._to_target_table(target_metadata, src_view)
+        digest = hashlib.sha1(definition.encode('utf-8')).hexdigest()
+        if exists and digest == self.checkpoints.get(src_view.name, name=VIEW):
+            return True
+
+        start = time.time()
+        try:
+            # sqlite has no CREATE OR REPLACE VIEW
+            replace = exists and self.trg_engine.dialect.name != 'sqlite'
+            if exists and not replace:
+                self._run_target_transaction(DropView(trg_view))
+            self._run_target_transaction(CreateView(trg_view, text(definition), or_replace=replace))
+            self._set_checkpoint(src_view.name, digest, VIEW)
+        except Exception as e:
+            self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+            return False
+        else:
+            self.log.view_created(
+                src_view.name, time.time() - start, scheme=self.scheme, db=self.trg_db)
+            return True
+
     def _do_views(self, target_metadata, views):
-        for v in views:
-            trg_view = self._to_target_table(target_metadata, v)
-            if not trg_view.exists():
-                view_definition = inspect(self.src_engine) \
-                    .get_view_definition(v.name)
-                select_index = view_definition.lower().index('select')
-                view_definition = view_definition[select_index:]
-                stmt = CreateView(trg_view, text(view_definition))
-                try:
-                    self._run_target_transaction(stmt,)
-                except Exception as e:
-                    self.log.exception(e, scheme=self.scheme, db=self.trg_db)
-                else:
-                    self.log.view_created(
-                        v.name, scheme=self.scheme, db=self.trg_db)
+        views = {v.name: v for v in views}
+        with self._phase('view_definitions'):
+            definitions = get_view_definitions(self.src_engine, self.src_db, list(views))
+        dependencies = view_dependencies(definitions)
+        existing = set(get_view_names(self.trg_engine))
 
-    def _do_dynamic(self, target_metadata, dynamic_tables):
+        failed = set()
+        with ThreadPoolExecutor(max_workers=max(1, self.scheme_conf.view_workers)) as executor:
+            for level in view_levels(dependencies):
+                for name in level:
+                    if dependencies[name] & failed:
+                        failed.add(name)
+                        self.log.view_skipped(name, scheme=self.scheme, db=self.trg_db)
+                level = [name for name in level if name not in failed]
+                created = executor.map(lambda name: self._create_view(
+                    target_metadata, views[name], definitions[name], name in existing), level)
+                failed.update(name for name, ok in zip(level, created) if not ok)
+
+    def _copy_dynamic(self, src_table, table, fingerprint=None):
+        session = self.TargetSession()
+        connection = self.src_engine.connect().execution_options(stream_results=True)
+        count = 0
+        start = time.time()
+        try:
+            values = connection.execute(src_table.select())
+            while True:
+                chunk_start = time.time()
+                rows = values.fetchmany(self.scheme_conf.dynamic_chunk_size)
+                if not rows:
+                    break
+                self.writer.write(session, table, rows)
+                count += len(rows)
+                if metrics.enabled:
+                    metrics.inc('timeds_bytes_total', estimate_bytes(rows), scheme=self.scheme, db=self.trg_db,
+                                table=table.name, kind='dynamic')
+                if self.scheme_conf.dynamic_intermediate_commits:
+                    session.commit()
+                metrics.observe('timeds_dynamic_chunk_seconds', time.time() - chunk_start, scheme=self.scheme,
+                                db=self.trg_db, table=table.name)
+            if fingerprint is not None:
+                self.checkpoints.set(session, table.name, fingerprint, name=FINGERPRINT)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+            return False
+        else:
+            end = time.time()
+            self.log.batch_dynamic(
+                count, end - start, table.name, scheme=self.scheme, db=self.trg_db)
+            return True
+        finally:
+            session.close()
+            connection.close()
+
+    def _get_fingerprint(self, src_table):
+        if not self.scheme_conf.dynamic_fingerprint:
+            return None
+
+        try:
+            return get_table_fingerprint(self.src_engine, self.src_db, src_table.name,
+                                         method=self.scheme_conf.dynamic_fingerprint)
+        except Exception as e:
+            self.log.exception(e, scheme=self.scheme, db=self.src_db)
+            return None
+
+    def _set_checkpoint(self, table_name, value, name):
         session = self.TargetSession()
+        try:
+            if value is None:
+                self.checkpoints.delete(session, table_name, name=name)
+            else:
+                self.checkpoints.set(session, table_name, value, name=name)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.checkpoints.invalidate(table_name, name=name)
+            raise e
+        finally:
+            session.close()
+
+    def _set_fingerprint(self, table_name, fingerprint):
+        self._set_checkpoint(table_name, fingerprint, FINGERPRINT)
+
+    def _swap_dynamic(self, src_table, table, fingerprint):
+        preparer = self.trg_engine.dialect.identifier_preparer
+        shadow_metadata = MetaData(bind=self.trg_engine)
+        shadow = src_table.tometadata(shadow_metadata, name='%s__new' % table.name)
+        old = '%s__old' % table.name
+        for key, value in self.dialect_kwargs.items():
+            shadow.dialect_kwargs[key] = value
+
+        if shadow.exists():
+            shadow.drop()
+        self.log.dynamic_recreated(
+            shadow.name, scheme=self.scheme, db=self.trg_db)
+        shadow.create()
+
+        if not self._copy_dynamic(src_table, shadow):
+            shadow.drop()
+            return
+
+        if table.exists():
+            # left behind by a swap interrupted before its DROP, it would fail the rename
+            self.trg_engine.execute('DROP TABLE IF EXISTS %s' % preparer.quote(old))
+            rename_tables(self.trg_engine, [(table.name, old), (shadow.name, table.name)])
+            self.trg_engine.execute('DROP TABLE %s' % preparer.quote(old))
+        else:
+            rename_tables(self.trg_engine, [(shadow.name, table.name)])
+        self.log.dynamic_swapped(
+            table.name, scheme=self.scheme, db=self.trg_db)
+        self._set_fingerprint(table.name, fingerprint)
+
+    def _diff_dynamic(self, src_table, table, fingerprint):
+        """Writes only the rows that differ, found by comparing checksums of primary key ranges"""
+        differ = ChunkDiff(src_table, table, leaf_rows=self.scheme_conf.dynamic_diff_rows)
+        session = self.TargetSession()
+        written = deleted = 0
+        start = time.time()
+        try:
+            for lower, upper in differ.mismatched():
+                chunk_start = time.time()
+                upserts, deletes = differ.diff(lower, upper)
+                if deletes:
+                    session.execute(differ.delete(deletes))
+                if upserts:
+                    self.writer.write(session, table, upserts)
+                written += len(upserts)
+                deleted += len(set(deletes) - set(differ.key(row) for row in upserts))
+                if self.scheme_conf.dynamic_intermediate_commits:
+                    session.commit()
+                metrics.observe('timeds_dynamic_chunk_seconds', time.time() - chunk_start, scheme=self.scheme,
+                                db=self.trg_db, table=table.name)
+            if fingerprint is not None:
+                self.checkpoints.set(session, table.name, fingerprint, name=FINGERPRINT)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.checkpoints.invalidate(table.name, name=FINGERPRINT)
+            raise e
+        else:
+            self.log.dynamic_diffed(
+                table.name, written, deleted, time.time() - start, scheme=self.scheme, db=self.trg_db)
+        finally:
+            session.close()
+
+    def _dynamic_one(self, src_table, table):
+        with self._phase('fingerprint', table.name):
+            fingerprint = self._get_fingerprint(src_table)
+        if fingerprint is not None and table.exists() \
+                and fingerprint == self.checkpoints.get(table.name, name=FINGERPRINT):
+            self.log.dynamic_unchanged(
+                table.name, scheme=self.scheme, db=self.trg_db)
+            return
+
+        if self.scheme_conf.dynamic_diff and src_table.primary_key.columns and table.exists():
+            try:
+                self._diff_dynamic(src_table, table, fingerprint)
+                return
+            except Exception as e:
+                # copied in full below
+                self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+
+        if self.scheme_conf.dynamic_swap:
+            self._swap_dynamic(src_table, table, fingerprint)
+            return
+
+        # the stored fingerprint no longer describes the table once it is dropped
+        self._set_fingerprint(table.name, None)
+        if table.exists():
+            table.drop()
+        self.log.dynamic_recreated(
+            table.name, scheme=self.scheme, db=self.trg_db)
+        table.create()
+        self._copy_dynamic(src_table, table, fingerprint=fingerprint)
+
+    def _do_dynamic(self, target_metadata, dynamic_tables):
         for src_table in dynamic_tables:
             table = self._to_target_table(target_metadata, src_table)
-            if table.exists():
-                table.drop()
-            self.log.dynamic_recreated(
-                table.name, scheme=self.scheme, db=self.trg_db)
+            try:
+                with self._phase('dynamic', table.name):
+                    self._dynamic_one(src_table, table)
+            except Exception as e:
+                self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+
+    def _cursor_names(self, table):
+        return cursor_names(table, self.order_by, with_primary_key=self.keyset_pagination)
+
+    def _row_cursor(self, table, row):
+        if table.name in self.raw:
+            return self.raw[table.name].cursor(row)
+        return tuple(row[name] for name in self._cursor_names(table))
+
+    def _get_latest(self, table):
+        if not self.scheme_conf.verify_watermark:
+            latest = self._checkpointed_latest(table)
+            if latest is not None:
+                return latest
+
+        return self._target_latest(table)
+
+    def _checkpointed_latest(self, table):
+        names = self._cursor_names(table)
+        columns = [table.c[name] for name in names]
+        if len(names) == 1:
+            latest = self.checkpoints.get(table.name)
+            return None if latest is None else (parse_value(columns[0].type, latest),)
+        latest = self.checkpoints.get(table.name, name=CURSOR)
+        return None if latest is None else decode_cursor(columns, latest)
+
+    def _target_latest(self, table):
+        columns = [table.c[name] for name in self._cursor_names(table)]
+        latest = select(columns).limit(1).order_by(*[column.desc() for column in columns]).execute().first()
+        return None if latest is None or latest[0] is None else tuple(latest)
+
+    def _invalidate_latest(self, table_name):
+        # other checkpoints of the table, e.g. its deferred indexes, are not touched by a batch
+        self.checkpoints.invalidate(table_name, name=WATERMARK)
+        self.checkpoints.invalidate(table_name, name=CURSOR)
+
+    def _set_latest(self, session, table, latest):
+        self.checkpoints.set(session, table.name, latest[0])
+        if len(latest) > 1:
+            self.checkpoints.set(session, table.name, encode_cursor(latest), name=CURSOR)
+
+    def _create_target_table(self, table):
+        if table.name in self.created:
+            return
+
+        if table.exists():
+            self.created.add(table.name)
+            return
+
+        deferred = deferred_indexes(table, self.order_by) if self.scheme_conf.defer_indexes else []
+        # a checkpoint left over from a dropped target table must not be trusted
+        session = self.TargetSession()
+        try:
+            self.checkpoints.delete(session, table.name)
+            # recorded first, so that a crash right after the CREATE does not lose them
+            if deferred:
+                self.checkpoints.set(session, table.name, encode_indexes(deferred), name=INDEXES)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.checkpoints.invalidate(table.name)
+            raise e
+        finally:
+            session.close()
+
+        table.indexes.difference_update(deferred)
+        try:
             table.create()
+        finally:
+            table.indexes.update(deferred)
+        if deferred:
+            self.log.indexes_deferred(table.name, len(deferred), scheme=self.scheme, db=self.trg_db)
+
+    def _build_indexes(self, src_table, table):
+        """Adds the indexes left out of a target table during its backfill, once it caught up"""
+        encoded = self.checkpoints.get(table.name, name=INDEXES)
+        if encoded is None:
+            return
+
+        start = time.time()
+        try:
+            with self._phase('indexes', table.name):
+                built = build_indexes(self.trg_engine, table.name, decode_indexes(src_table, encoded))
+            self._set_checkpoint(table.name, None, INDEXES)
+        except Exception as e:
+            # still recorded, built again after the next batches
+            self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+            return
+        self.log.indexes_built(table.name, built, time.time() - start, scheme=self.scheme, db=self.trg_db)
+
+    def _batch_size(self, table):
+        with self.lock:
+            if table.name not in self.batch_sizes:
+                self.batch_sizes[table.name] = get_batch_size(self.scheme_conf, self.checkpoints, table.name)
+            return self.batch_sizes[table.name]
+
+    def _reserve(self):
+        """Reserves the byte budget of a streamed batch from the process-wide memory budget"""
+        return memory_budget.reserve(self.scheme_conf.batch_bytes if self.scheme_conf.stream_fetch else 0,
+                                     self.stopped)
+
+    def _batch_limit(self, table_name, size):
+        fitted = self.fitted.get(table_name, None)
+        return size if fitted is None else min(size, fitted)
+
+    def _fetch(self, table_name, query, limit, raw=None):
+        """
+        Runs a batch query. With stream_fetch, rows are streamed from a
+        server-side cursor until their estimated size reaches batch_bytes: the
+        rest of the batch is discarded and the next batches of the table ask
+        for as many rows as fitted. Returns the rows and False when they were
+        cut short.
+        """
+        if not self.scheme_conf.stream_fetch:
+            if raw is None:
+                return query.execute().fetchall(), True
+            with self.src_engine.connect() as connection:
+                return raw.fetch(connection, query), True
+
+        with self.src_engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(query)
+            try:
+                fetchmany = result.fetchmany if raw is None else result.cursor.fetchmany
+                values, complete = fetch_bounded(fetchmany, self.scheme_conf.batch_bytes)
+            finally:
+                result.close()
+
+        fitted = self.fitted.get(table_name, None)
+        if not complete:
+            self.fitted[table_name] = max(1, len(values))
+        elif fitted is not None and len(values) >= limit:
+            # the rows got narrower, ask for more of them again
+            self.fitted[table_name] = fitted * 2
+        return values, complete
+
+    def _read_batch(self, src_table, latest, limit):
+        limit = self._batch_limit(src_table.name, limit)
+        columns = [src_table.c[name] for name in self._cursor_names(src_table)]
+        data_query = src_table.select(limit=limit).order_by(*columns)
+
+        if latest is not None:
+            data_query = data_query.where(after(columns, latest))
+
+        read_start = time.time()
+        with self._phase('read', src_table.name) as phase:
+            values, _ = self._fetch(src_table.name, data_query, limit, raw=self.raw.get(src_table.name, None))
+            phase['rows'] = len(values)
+        return values, time.time() - read_start
+
+    def _write_batch(self, session, table, values, batch_size, read_time):
+        write_start = time.time()
+        rows = values
+        columns = None
+        if table.name in self.raw:
+            with self._phase('convert', table.name, rows=len(values)):
+                rows = self.raw[table.name].for_target(values)
+            columns = self.raw[table.name].names
+        with self._phase('write', table.name, rows=len(values)):
+            self.writer.write(session, table, rows, columns=columns)
+        self._set_latest(session, table, self._row_cursor(table, values[-1]))
+        if metrics.enabled:
+            metrics.inc('timeds_bytes_total', estimate_bytes(values), scheme=self.scheme, db=self.trg_db,
+                        table=table.name, kind='include')
+        if batch_size.update(values, read_time + time.time() - write_start):
+            self.checkpoints.set(session, table.name, batch_size.size, name=BATCH_SIZE)
 
-            values = src_table.select().execute()
+    def _record_lag(self, src_table, latest, source_latest=None):
+        """Source max(order_by), queried unless given, minus latest, the committed watermark"""
+        if not metrics.enabled or latest is None:
+            return
+
+        try:
+            if source_latest is None:
+                source_latest = select([func.max(src_table.c[self.order_by])]).scalar()
+                self.source_max[src_table.name] = source_latest
+            lag = source_latest - latest[0]
+            lag = lag.total_seconds() if hasattr(lag, 'total_seconds') else float(lag)
+        except Exception:
+            return
+        metrics.set('timeds_replication_lag', lag, scheme=self.scheme, db=self.trg_db, table=src_table.name)
+
+    def _record_committed_lag(self, src_table, idle=False):
+        """
+        Once per table and cycle, when it caught up or was given up on. The
+        source max of an idle table did not change since it was last measured,
+        so it costs no query at all.
+        """
+        if not metrics.enabled:
+            return
+        if idle and self.source_max.get(src_table.name, None) is None:
+            return
+        try:
+            table = self._to_target_table(self.trg_metadata, src_table)
+            latest = self._checkpointed_latest(table) if idle else self._get_latest(table)
+        except Exception:
+            return
+        self._record_lag(src_table, latest, self.source_max[src_table.name] if idle else None)
+
+    def _needs_snapshot(self, table):
+        if self.scheme_conf.snapshot_workers < 2:
+            return False
+        if self.checkpoints.get(table.name, name=SNAPSHOT) is not None:
+            return True
+        return self.checkpoints.get(table.name) is None \
+            and select([table.c[self.order_by]]).limit(1).execute().first() is None
+
+    def _snapshot_ranges(self, src_table, table):
+        encoded = self.checkpoints.get(table.name, name=SNAPSHOT)
+        if encoded is not None:
+            return decode_ranges(table.c[self.order_by], encoded)
+
+        ranges = plan_ranges(src_table, self.order_by, self.scheme_conf.snapshot_workers)
+        if ranges is None:
+            return None
+
+        session = self.TargetSession()
+        try:
+            self.checkpoints.set(session, table.name, encode_ranges(ranges), name=SNAPSHOT)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.checkpoints.invalidate(table.name, name=SNAPSHOT)
+            raise e
+        finally:
+            session.close()
+        self.log.snapshot_planned(table.name, len(ranges), scheme=self.scheme, db=self.trg_db)
+        return ranges
+
+    def _snapshot_range(self, src_table, table, name, lower, upper):
+        # paginated by (order_by, primary key) whatever keyset_pagination says, ties must not be lost
+        names = cursor_names(src_table, self.order_by, with_primary_key=True)
+        columns = [src_table.c[column] for column in names]
+        bounds = columns[0] <= upper
+        if lower is not None:
+            bounds = and_(columns[0] > lower, bounds)
+
+        batch_size = self._batch_size(table)
+        progress = self.checkpoints.get(table.name, name=name)
+        batch_nb = 1
+        attempt = 0
+        while progress != 'done' and not self.stopped.is_set():
+            self._wait_hosts()
+            latest = None if progress is None else decode_cursor([table.c[column] for column in names], progress)
+            limit = self._batch_limit(table.name, batch_size.size)
+            query = src_table.select(limit=limit).where(bounds).order_by(*columns)
+            if latest is not None:
+                query = query.where(after(columns, latest))
+
+            reservation = self._reserve()
             start = time.time()
+            session = self.TargetSession()
+            role = 'source'
             try:
-                for v in values:
-                    stmt = table.insert(None).values(v)
-                    session.execute(stmt,)
+                values, complete = self._fetch(table.name, query, limit)
+                read_time = time.time() - start
+                write_start = time.time()
+                role = 'target'
+                if len(values):
+                    self.writer.write(session, table, values)
+                    if metrics.enabled:
+                        metrics.inc('timeds_bytes_total', estimate_bytes(values), scheme=self.scheme,
+                                    db=self.trg_db, table=table.name, kind='include')
+                    if batch_size.update(values, time.time() - start):
+                        self.checkpoints.set(session, table.name, batch_size.size, name=BATCH_SIZE)
+                if complete and len(values) < limit:
+                    position = 'done'
+                else:
+                    position = encode_cursor([values[-1][column] for column in names])
+                self.checkpoints.set(session, table.name, position, name=name)
+                session.commit()
             except Exception as e:
                 session.rollback()
-                self.log.exception(e, scheme=self.scheme, db=self.trg_db)
+                # resume from the committed progress of the range, never from its lower bound
+                self.checkpoints.invalidate(table.name, name=name)
+                progress = self.checkpoints.get(table.name, name=name)
+                attempt += 1
+                if not self._batch_failed(e, table.name, role, attempt):
+                    break
             else:
-                session.commit()
+                self._batch_succeeded()
+                attempt = 0
                 end = time.time()
-                self.log.batch_dynamic(
-                    values.rowcount, end - start, table.name, scheme=self.scheme, db=self.trg_db)
+                if len(values):
+                    self.log.batch_include(batch_nb, len(values), table.name, format_cursor(latest), end-start,
+                                           read_time, end-write_start, scheme=self.scheme, db=self.trg_db)
+                    batch_nb += 1
+                progress = position
             finally:
                 session.close()
+                reservation.release()
 
-    def _do_include(self, target_metadata, time_tables):
-        for src_table in time_tables:
-            table = self._to_target_table(target_metadata, src_table)
-            table.create(checkfirst=True)
+    def _snapshot(self, src_table, table):
+        """
+        Copies an empty target table as concurrent ranges of order_by, then
+        hands over to incremental replication from the highest copied row.
+        Returns False while some range is not copied yet.
+        """
+        ranges = self._snapshot_ranges(src_table, table)
+        if ranges is None:
+            return True
 
-        batch_nb = 1
-        for src_table in time_tables:
-            table = self._to_target_table(target_metadata, src_table)
+        start = time.time()
+        names = ['%s:%s' % (SNAPSHOT, i) for i in range(len(ranges))]
+        threads = [th.Thread(target=self._snapshot_range, args=(src_table, table, name, lower, upper),
+                             name='snapshot-%s-%s' % (table.name, i), daemon=True)
+                   for i, (name, (lower, upper)) in enumerate(zip(names, ranges))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if any(self.checkpoints.get(table.name, name=name) != 'done' for name in names):
+            return False
 
-            latest = None
-            while True:
-                start = time.time()
-                session = self.TargetSession()
+        session = self.TargetSession()
+        try:
+            latest = self._target_latest(table)
+            if latest is not None:
+                self._set_latest(session, table, latest)
+            for name in names + [SNAPSHOT]:
+                self.checkpoints.delete(session, table.name, name=name)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            self.checkpoints.invalidate(table.name)
+            raise e
+        finally:
+            session.close()
+        self.log.snapshot_done(table.name, time.time() - start, scheme=self.scheme, db=self.trg_db)
+        return True
+
+    def _include_serial(self, src_table, table, batch_nb):
+        """Returns the next batch number and whether the table was caught up"""
+        batch_size = self._batch_size(table)
+        latest = None
+        stale = True
+        attempt = 0
+        while not self.stopped.is_set():
+            self._wait_hosts()
+            reservation = self._reserve()
+            start = time.time()
+            session = self.TargetSession()
+
+            role = 'target'
+            try:
+                if stale:
+                    with self._phase('watermark', table.name):
+                        latest = self._get_latest(table)
+                    stale = False
+
+                role = 'source'
+                values, read_time = self._read_batch(src_table, latest, batch_size.size)
+                if len(values):
+                    role = 'target'
+                    write_start = time.time()
+                    self._write_batch(session, table, values, batch_size, read_time)
+                    with self._phase('commit', table.name):
+                        session.commit()
+                else:
+                    return batch_nb, True
+            except (exc.OperationalError, exc.InternalError) as e:
+                stale = True
+                self._invalidate_latest(table.name)
+                attempt += 1
+                if not self._batch_failed(e, table.name, role, attempt):
+                    break
+            except Exception as e:
+                session.rollback()
+                stale = True
+                self._invalidate_latest(table.name)
+                attempt += 1
+                if not self._batch_failed(e, table.name, role, attempt):
+                    break
+            else:
+                self._batch_succeeded()
+                attempt = 0
+                write_end = time.time()
+                end = time.time()
+                self.log.batch_include(batch_nb, len(values), table.name, format_cursor(latest), end-start,
+                                       read_time, write_end-write_start, scheme=self.scheme, db=self.trg_db)
+                latest = self._row_cursor(table, values[-1])
+                batch_nb += 1
+            finally:
+                session.close()
+                reservation.release()
+
+        return batch_nb, False
 
+    def _read_ahead(self, src_table, latest, batch_size, batches, stop):
+        while not stop.is_set():
+            # held until the writer is done with the batch
+            reservation = self._reserve()
+            try:
+                values, read_time = self._read_batch(src_table, latest, batch_size.size)
+            except Exception as e:
+                reservation.release()
+                item = (None, 0, e, reservation)
+            else:
+                item = (values, read_time, None, reservation)
+
+            while not stop.is_set():
                 try:
-                    latest = select([table.c[self.order_by]]).limit(1).order_by(table.c[self.order_by].desc()).scalar()
-                    data_query = src_table.select(limit=self.scheme_conf.batch_size).order_by(src_table.c[self.order_by])
-
-                    if latest:
-                        data_query = data_query.where(src_table.c[self.order_by] > latest)
-
-                    read_start = time.time()
-                    result_values = data_query.execute()
-                    values = result_values.fetchall()
-                    read_end = time.time()
-                    if len(values):
-                        write_start = time.time()
-                        stmt = table.insert(None)
-                        session.execute(stmt, values)
-                    else:
+                    batches.put(item, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            else:
+                reservation.release()
+
+            if item[2] is not None or not len(item[0]):
+                return
+            latest = self._row_cursor(src_table, values[-1])
+
+    def _include_pipelined(self, src_table, table, batch_nb):
+        """Returns the next batch number and whether the table was caught up"""
+        batch_size = self._batch_size(table)
+        attempt = 0
+        while not self.stopped.is_set():
+            self._wait_hosts()
+            try:
+                with self._phase('watermark', table.name):
+                    latest = self._get_latest(table)
+            except Exception as e:
+                self._invalidate_latest(table.name)
+                attempt += 1
+                if not self._batch_failed(e, table.name, 'target', attempt):
+                    break
+                continue
+
+            batches = queue.Queue(maxsize=self.scheme_conf.pipeline_depth)
+            stop = th.Event()
+            reader = th.Thread(target=self._read_ahead, args=(src_table, latest, batch_size, batches, stop), daemon=True)
+            reader.start()
+
+            done = False
+            role = 'source'
+            try:
+                while not self.stopped.is_set():
+                    start = time.time()
+                    role = 'source'
+                    values, read_time, error, reservation = batches.get()
+                    if error is not None:
+                        raise error
+                    if not len(values):
+                        reservation.release()
+                        done = True
                         break
-                except (exc.OperationalError, exc.InternalError) as e:
-                    self.log.exception(e, scheme=self.scheme, db=self.trg_db)
-                except Exception as e:
-                    session.rollback()
-                    self.log.exception(e, scheme=self.scheme, db=self.trg_db)
-                else:
-                    session.commit()
-                    write_end = time.time()
+
+                    session = self.TargetSession()
+                    write_start = time.time()
+                    role = 'target'
+                    try:
+                        self._write_batch(session, table, values, batch_size, read_time)
+                        with self._phase('commit', table.name):
+                            session.commit()
+                    except Exception as e:
+                        session.rollback()
+                        raise e
+                    finally:
+                        session.close()
+                        reservation.release()
+                    self._batch_succeeded()
+                    attempt = 0
+
                     end = time.time()
-                    self.log.batch_include(batch_nb, len(values), table.name, latest, end-start,
-                                           read_end-read_start, write_end-write_start, scheme=self.scheme, db=self.trg_db)
+                    self.log.batch_include(batch_nb, len(values), table.name, format_cursor(latest), end-start,
+                                           read_time, end-write_start, scheme=self.scheme, db=self.trg_db)
+                    latest = self._row_cursor(table, values[-1])
                     batch_nb += 1
-                finally:
-                    session.close()
+            except Exception as e:
+                # restart the pipeline from the last committed watermark
+                self._invalidate_latest(table.name)
+                attempt += 1
+                if not self._batch_failed(e, table.name, role, attempt):
+                    break
+            finally:
+                stop.set()
+                reader.join()
+                # batches read ahead and never written
+                while not batches.empty():
+                    batches.get()[3].release()
 
-    def run(self):
-        src_metadata = MetaData(bind=self.src_engine,)
-        self.log.reflecting_source(scheme=self.scheme, db=self.src_db)
-        src_metadata.reflect(views=self.only_dynamic_and_views)
+            if done:
+                return batch_nb, True
+
+        return batch_nb, False
+
+    def _active_tables(self, time_tables):
+        """
+        Splits off the tables whose source activity did not change since they
+        were last replicated, except on every idle_full_check-th cycle. Also
+        returns the activity to checkpoint once a table is replicated.
+        """
+        if not self.scheme_conf.skip_idle_tables:
+            return time_tables, {}
 
-        trg_metadata = MetaData(bind=self.trg_engine,)
+        try:
+            with self._phase('activity'):
+                activity = get_table_activity(self.src_engine, self.src_db)
+            cycle = int(self.checkpoints.get('', name=CYCLE) or 0) + 1
+            self._set_checkpoint('', cycle, CYCLE)
+        except Exception as e:
+            self.log.exception(e, scheme=self.scheme, db=self.src_db)
+            return time_tables, {}
+
+        if cycle % self.scheme_conf.idle_full_check == 0:
+            return time_tables, activity
+
+        active = [table for table in time_tables if table.name not in activity
+                  or activity[table.name] != self.checkpoints.get(table.name, name=ACTIVITY)]
+        for src_table in time_tables:
+            if src_table not in active:
+                self._record_committed_lag(src_table, idle=True)
+        if len(active) < len(time_tables):
+            self.log.idle_tables(len(time_tables) - len(active), len(time_tables), scheme=self.scheme, db=self.src_db)
+        return active, activity
+
+    def _do_include(self, target_metadata, time_tables, activity={}):
+        for src_table in time_tables:
+            table = self._to_target_table(target_metadata, src_table)
+            self._create_target_table(table)
+            if self.scheme_conf.raw_fetch and table.name not in self.raw:
+                self.raw[table.name] = RawFetch(src_table, table, self.src_engine.dialect, self.trg_engine.dialect,
+                                                self._cursor_names(src_table))
 
-        src_views = inspect(self.src_engine).get_view_names()
-        include_tables = src_metadata.tables.values()
+        batch_nb = 1
+        for src_table in time_tables:
+            if self.stopped.is_set():
+                break
+            table = self._to_target_table(target_metadata, src_table)
+            if self._needs_snapshot(table):
+                with self._phase('snapshot', table.name):
+                    snapshotted = self._snapshot(src_table, table)
+                if self.stopped.is_set():
+                    break
+                if not snapshotted:
+                    # a range was given up on, incremental replication would skip its missing rows
+                    continue
+            if self.scheme_conf.pipeline_depth:
+                batch_nb, caught_up = self._include_pipelined(src_table, table, batch_nb)
+            else:
+                batch_nb, caught_up = self._include_serial(src_table, table, batch_nb)
+            self._record_committed_lag(src_table)
+            if caught_up:
+                self._build_indexes(src_table, table)
+            # read before the table was replicated, so rows written meanwhile show up as a change
+            if table.name in activity and caught_up:
+                self._set_checkpoint(table.name, activity[table.name], ACTIVITY)
+
+    def _replicates_dynamic(self):
+        return self.only_dynamic_and_views or (self.scheduled and self.scheme_conf.dynamic_interval > 0)
+
+    def _filter_names(self, table_names):
         dynamic_tables = []
         exclude_tables = []
+        include_tables = table_names
+
+        if self.dynamic_tables:
+            dynamic_tables = [name for name in table_names
+                              if re.match(self.dynamic_tables, name)]
+
+        if self.include_tables:
+            include_tables = [name for name in include_tables
+                              if re.match(self.include_tables, name)]
+
+        if self.exclude_tables:
+            exclude_tables = [name for name in include_tables
+                              if re.match(self.exclude_tables, name)]
+
+        include_tables = [name for name in include_tables
+                          if name not in exclude_tables and name not in dynamic_tables]
+        return include_tables, dynamic_tables
+
+    def _reflect(self, metadata, engine, db, role, names, **kwargs):
+        start = time.time()
+        with self.hooks.phase('reflect', scheme=self.scheme, db=db, table=None, role=role):
+            if self.reflection_cache:
+                self.reflection_cache.reflect(metadata, engine, db, role, names, **kwargs)
+            else:
+                reflect_tables(metadata, names, **kwargs)
+        metrics.set('timeds_reflection_seconds', time.time() - start, scheme=self.scheme, db=db, role=role)
+
+    def prepare(self):
+        with self._phase('prepare'):
+            self._prepare()
+
+    def _prepare(self):
+        if not database_exists(self.trg_url):
+            create_database(self.trg_url)
+            self.log.database_created(scheme=self.scheme, db=self.trg_db)
+
+        with_views = self._replicates_dynamic()
+        src_views = get_view_names(self.src_engine) if with_views else []
+        include_tables, dynamic_tables = self._filter_names(get_table_names(self.src_engine))
 
+        # only reflect what survived the configured filters
+        names = []
+        if not self.only_dynamic_and_views:
+            names.extend(include_tables)
+        if with_views:
+            names.extend(dynamic_tables)
+            names.extend(src_views)
+
+        self.src_metadata = MetaData(bind=self.src_engine,)
+        self.log.reflecting_source(scheme=self.scheme, db=self.src_db)
+        self._reflect(self.src_metadata, self.src_engine, self.src_db, 'source', names, views=with_views)
+
+        self.trg_metadata = MetaData(bind=self.trg_engine,)
         self.log.reflecting_target(scheme=self.scheme, db=self.trg_db)
         try:
-            trg_metadata.reflect(
-                views=self.only_dynamic_and_views, **self.dialect_kwargs)
+            self._reflect(self.trg_metadata, self.trg_engine, self.trg_db, 'target', names,
+                          views=with_views, **self.dialect_kwargs)
         except Exception as e:
             self.log.exception(e, scheme=self.scheme)
 
-        if self.dynamic_tables:
-            dynamic_tables = [tab for tab in include_tables
-                              if re.match(self.dynamic_tables, tab.name) and tab not in src_views]
-            if self.only_dynamic_and_views:
-                self._do_dynamic(trg_metadata, dynamic_tables)
+        tables = self.src_metadata.tables
+        self.views = [tables[name] for name in src_views if name in tables]
+        self.dynamic = [tables[name] for name in dynamic_tables if with_views and name in tables]
+        self.include = [tables[name] for name in include_tables
+                        if not self.only_dynamic_and_views and name in tables]
+        self.include = [table for table in self.include if self._check_index(table)]
+        self.created = set()
+        # built from the tables just reflected, whose columns may have changed
+        self.raw = {}
+
+    def _check_index(self, src_table):
+        if self.missing_index == 'ignore' or has_index_on(src_table, self.order_by):
+            return True
+
+        refuse = self.missing_index == 'refuse'
+        self.log.missing_index(src_table.name, self.order_by, refuse, scheme=self.scheme, db=self.src_db)
+        return not refuse
+
+    def stop(self):
+        self.stopped.set()
 
-                views = [tab for tab in include_tables if tab.name in src_views]
-                self._do_views(trg_metadata, views)
+    def _schedule_tables(self):
+        interval = self.interval or self.scheme_conf.interval
+        dynamic_interval = self.scheme_conf.dynamic_interval or interval
+        keys = set()
 
         if not self.only_dynamic_and_views:
-            if self.include_tables:
-                include_tables = [tab for tab in include_tables
-                                  if re.match(self.include_tables, tab.name)]
+            for table in self.include:
+                keys.add(('include', table.name))
+                self.schedule.add(('include', table.name), interval)
 
-            if self.exclude_tables:
-                exclude_tables = [tab for tab in include_tables
-                                  if re.match(self.exclude_tables, tab.name)]
+        if self._replicates_dynamic() and self.dynamic_tables:
+            for table in self.dynamic:
+                keys.add(('dynamic', table.name))
+                self.schedule.add(('dynamic', table.name), dynamic_interval)
+            keys.add(('views', ''))
+            self.schedule.add(('views', ''), dynamic_interval)
 
-            include_tables = [table for table in include_tables
-                              if table not in exclude_tables and table not in dynamic_tables and table.name not in src_views]
+        self.schedule.retain(keys)
 
-            if include_tables:
-                self._do_include(trg_metadata, include_tables)
+    def _submit(self, pool, fn, *args, key=None):
+        return pool.submit(lambda: fn(*args), hosts=self.hosts, key=key,
+                           scheme=self.scheme, db=self.trg_db)
+
+    def _include_one(self, src_table, activity):
+        self._do_include(self.trg_metadata, [src_table], activity)
+
+    def _dynamic_then_views(self, pool, src_table, remaining, scheduled=False):
+        try:
+            if scheduled:
+                self._run_scheduled('dynamic', src_table.name)
+            else:
+                self._do_dynamic(self.trg_metadata, [src_table])
+        finally:
+            with self.lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            # views may select from dynamic tables, so they are created last
+            if last:
+                self._submit_views(pool, scheduled)
+
+    def _submit_views(self, pool, scheduled=False):
+        if scheduled:
+            self._submit(pool, self._run_scheduled, 'views', '', key=(self.scheme, self.src_db, self.trg_db, 'views', ''))
+        else:
+            self._submit(pool, self._do_views, self.trg_metadata, self.views)
+
+    def submit(self, pool):
+        """Prepares the replicator and queues one task per table to replicate once"""
+        self.prepare()
+        if self.only_dynamic_and_views:
+            if self.dynamic_tables:
+                if not self.dynamic:
+                    self._submit_views(pool)
+                remaining = [len(self.dynamic)]
+                for src_table in self.dynamic:
+                    self._submit(pool, self._dynamic_then_views, pool, src_table, remaining)
+        else:
+            tables, activity = self._active_tables(self.include)
+            for src_table in tables:
+                self._submit(pool, self._include_one, src_table, activity)
+
+    def _prepare_scheduled(self):
+        try:
+            self.prepare()
+        except Exception as e:
+            self.next_prepare = time.time() + (self.interval or self.scheme_conf.interval)
+            raise e
+        self._schedule_tables()
+
+    def _run_scheduled(self, kind, name, activity={}):
+        try:
+            if kind == 'include':
+                self._do_include(self.trg_metadata, [self.src_metadata.tables[name]], activity)
+            elif kind == 'dynamic':
+                self._do_dynamic(self.trg_metadata, [self.src_metadata.tables[name]])
+            else:
+                self._do_views(self.trg_metadata, self.views)
+        finally:
+            self.schedule.done((kind, name))
+
+    def submit_due(self, pool):
+        """Queues the tables that are due (daemon mode), re-reflecting every discovery_interval"""
+        if self.stopped.is_set():
+            return
+
+        now = time.time()
+        if now >= self.next_prepare:
+            self.next_prepare = now + self.scheme_conf.discovery_interval
+            self._submit(pool, self._prepare_scheduled, key=(self.scheme, self.src_db, self.trg_db, 'prepare', ''))
+            return
+
+        if (self.scheme, self.src_db, self.trg_db, 'prepare', '') in pool.active:
+            return
+
+        include = []
+        dynamic = []
+        views = False
+        for kind, name in self.schedule.pop_due(now):
+            key = (self.scheme, self.src_db, self.trg_db, kind, name)
+            if kind == 'include' and self.scheme_conf.skip_idle_tables:
+                if key not in pool.active:
+                    include.append(name)
+                continue
+            if kind == 'dynamic':
+                if key not in pool.active:
+                    dynamic.append(name)
+                continue
+            if kind == 'views':
+                views = True
+                continue
+            self._submit(pool, self._run_scheduled, kind, name, key=key)
+
+        if include:
+            self._submit(pool, self._submit_active, pool, include, key=(self.scheme, self.src_db, self.trg_db, 'activity', ''))
+        views = views and (self.scheme, self.src_db, self.trg_db, 'views', '') not in pool.active
+        self._submit_dynamic(pool, dynamic, views)
+
+    def _submit_dynamic(self, pool, names, views):
+        """
+        Queues the due dynamic tables, and the due views once every dynamic
+        table is done, as in one-shot mode: views may select from them
+        """
+        running = any((self.scheme, self.src_db, self.trg_db, 'dynamic', table.name) in pool.active
+                      for table in self.dynamic)
+        if not views or running:
+            # due views wait for the next call, once no dynamic table runs
+            for name in names:
+                self._submit(pool, self._run_scheduled, 'dynamic', name,
+                             key=(self.scheme, self.src_db, self.trg_db, 'dynamic', name))
+        elif not names:
+            self._submit_views(pool, scheduled=True)
+        else:
+            remaining = [len(names)]
+            for name in names:
+                self._submit(pool, self._dynamic_then_views, pool, self.src_metadata.tables[name], remaining, True,
+                             key=(self.scheme, self.src_db, self.trg_db, 'dynamic', name))
+
+    def _submit_active(self, pool, names):
+        """Queues the due include tables that are not idle and reschedules the others"""
+        tables = [self.src_metadata.tables[name] for name in names]
+        active, activity = self._active_tables(tables)
+        for table in tables:
+            if table not in active:
+                self.schedule.done(('include', table.name))
+        for table in active:
+            self._submit(pool, self._run_scheduled, 'include', table.name, activity,
+                         key=(self.scheme, self.src_db, self.trg_db, 'include', table.name))
+
+    def run(self):
+        """Replicates once in the calling thread"""
+        self.prepare()
+        if self.only_dynamic_and_views:
+            if self.dynamic_tables:
+                self._do_dynamic(self.trg_metadata, self.dynamic)
+                self._do_views(self.trg_metadata, self.views)
+        elif self.include:
+            self._do_include(self.trg_metadata, *self._active_tables(self.include))
 
 
 class SchemeReplicator:
 
-    def __init__(self, scheme, config, only_dynamic_and_views=False):
+    def __init__(self, scheme, config, only_dynamic_and_views=False, scheduled=False, interval=0, hooks=None,
+                 shard=None):
         self.config = config
         self.scheme = scheme
         self.only_dynamic_and_views = only_dynamic_and_views
+        self.scheduled = scheduled
+        self.interval = interval
         self.log = Log()
+        self.hooks = hooks or Hooks()
+        # (index, count): only the databases of this worker process
+        self.shard = shard
+        self.main_engine = None
+        self.replicators = {}
 
     def _get_db_name(self, db_conf, original):
         if not db_conf.naming_strategy or db_conf.naming_strategy == 'original':
@@ -213,11 +1186,13 @@ class SchemeReplicator:
         if db_conf.naming_strategy == 'replace':
             return re.sub(db_conf.source, db_conf.target, original)
 
-    def run(self):
-        replicators = []
+    def _bootstrap(self):
+        with self.hooks.phase('bootstrap', scheme=self.scheme, db=None, table=None):
+            self._connect()
 
-        main_engine = get_engine(self.config.source)
-        trg_engine = get_engine(self.config.target)
+    def _connect(self):
+        self.main_engine = get_shared_engine(self.config.source, pool_recycle=7200)
+        trg_engine = get_shared_engine(self.config.target, pool_recycle=7200)
         execute_first = self.config.target.execute_first
         if execute_first:
             try:
@@ -227,13 +1202,66 @@ class SchemeReplicator:
             else:
                 self.log.bootstrapped_with(execute_first, scheme=self.scheme)
 
+    def _create_replicator(self, db_conf, db, trg_db):
+        return DbReplicator(self.scheme, self.config, db, trg_db, only_dynamic_and_views=self.only_dynamic_and_views,
+                            include_tables=db_conf.include_tables, exclude_tables=db_conf.exclude_tables, dynamic_tables=db_conf.dynamic_tables, order_by=db_conf.order_by,
+                            scheduled=self.scheduled, interval=db_conf.interval or self.config.interval or self.interval,
+                            keyset_pagination=db_conf.keyset_pagination, missing_index=db_conf.missing_index,
+                            hooks=self.hooks)
+
+    def _databases(self):
         for db_conf in self.config.databases:
-            dbs = get_databases_like(main_engine, db_conf.source)
+            with self.hooks.phase('discover', scheme=self.scheme, db=None, table=None):
+                dbs = get_databases_like(self.main_engine, db_conf.source)
             for db in dbs:
-                trg_db = self._get_db_name(db_conf, db)
-                replicator = DbReplicator(self.scheme, self.config, db, trg_db, only_dynamic_and_views=self.only_dynamic_and_views,
-                                          include_tables=db_conf.include_tables, exclude_tables=db_conf.exclude_tables, dynamic_tables=db_conf.dynamic_tables, order_by=db_conf.order_by,)
-                replicators.append(replicator)
-                replicator.start()
+                if self.shard and shard_of(db, self.shard[1]) != self.shard[0]:
+                    continue
+                yield db_conf, db, self._get_db_name(db_conf, db)
+
+    def _host_limits(self, pool):
+        pool.set_limit(('source', '%s:%s' % (self.config.source.host, self.config.source.port)),
+                       self.config.source.max_concurrency)
+        pool.set_limit(('target', '%s:%s' % (self.config.target.host, self.config.target.port)),
+                       self.config.target.max_concurrency)
+
+    def run(self, pool):
+        """Queues every matched database on the pool to be replicated once"""
+        replicators = []
+        self._bootstrap()
+        self._host_limits(pool)
+
+        for db_conf, db, trg_db in self._databases():
+            replicator = self._create_replicator(db_conf, db, trg_db)
+            replicators.append(replicator)
+            replicator._submit(pool, replicator.submit, pool)
 
         return replicators
+
+    def discover(self, pool):
+        """
+        Creates replicators for newly matched databases and stops those whose
+        database is no longer matched (daemon mode).
+        """
+        if self.main_engine is None:
+            self._bootstrap()
+            self._host_limits(pool)
+
+        matched = set()
+        for db_conf, db, trg_db in self._databases():
+            matched.add((db, trg_db))
+            if (db, trg_db) not in self.replicators:
+                self.replicators[(db, trg_db)] = self._create_replicator(db_conf, db, trg_db)
+
+        for key in list(self.replicators):
+            if key not in matched:
+                self.replicators.pop(key).stop()
+
+        return list(self.replicators.values())
+
+    def submit_due(self, pool):
+        for replicator in list(self.replicators.values()):
+            replicator.submit_due(pool)
+
+    def stop(self):
+        for replicator in self.replicators.values():
+            replicator.stop()
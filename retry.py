@@ -0,0 +1,132 @@
+import random
+import threading as th
+from sqlalchemy import exc, text
+
+
+# MySQL: can't connect (2002, 2003), server gone away or connection lost (2006, 2013),
+# too many connections (1040), server shutting down (1053)
+CONNECTION_ERRORS = {2002, 2003, 2006, 2013, 1040, 1053}
+# MySQL: lock wait timeout (1205), deadlock (1213)
+LOCK_ERRORS = {1205, 1213}
+# sqlite: SQLITE_BUSY, SQLITE_LOCKED
+SQLITE_LOCK_ERRORS = {5, 6}
+
+
+def _error_code(error):
+    args = getattr(getattr(error, 'orig', error), 'args', ())
+    return args[0] if args and isinstance(args[0], int) else None
+
+
+def is_connection_error(error):
+    """Errors telling that a server cannot be reached, which count towards its circuit breaker"""
+    if isinstance(error, exc.DBAPIError) and error.connection_invalidated:
+        return True
+    return _error_code(error) in CONNECTION_ERRORS
+
+
+def is_transient(error):
+    """
+    Errors worth retrying: lost connections, lock wait timeouts, deadlocks,
+    connection pool timeouts... Anything else, e.g. an unknown column or a denied access, fails the same
+    way on every attempt.
+    """
+    if is_connection_error(error) or _error_code(error) in LOCK_ERRORS or isinstance(error, exc.TimeoutError):
+        return True
+    return getattr(getattr(error, 'orig', None), 'sqlite_errorcode', None) in SQLITE_LOCK_ERRORS
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter between the attempts at a batch"""
+
+    def __init__(self, attempts=5, base_delay=1, max_delay=60, breaker_failures=5, probe_interval=10):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker_failures = breaker_failures
+        self.probe_interval = probe_interval
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+def get_retry_policy(scheme_conf):
+    if not scheme_conf.retry:
+        return RetryPolicy()
+
+    conf = scheme_conf.retry
+    return RetryPolicy(conf.attempts, conf.base_delay, conf.max_delay, conf.breaker_failures, conf.probe_interval)
+
+
+def probe(engine):
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+
+
+class CircuitBreaker:
+    """
+    Opened after too many consecutive transient errors against a server: every
+    replicator using the server waits until a health probe succeeds.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = th.Lock()
+        self.failures = 0
+        self.probing = False
+        self.closed = th.Event()
+        self.closed.set()
+
+    def success(self):
+        with self.lock:
+            self.failures = 0
+
+    def failure(self, threshold):
+        """Returns True when this failure opened the breaker"""
+        with self.lock:
+            self.failures += 1
+            if self.failures < threshold or not self.closed.is_set():
+                return False
+            self.closed.clear()
+            return True
+
+    def wait(self, engine, interval, stopped):
+        """
+        Blocks while the breaker is open, one of the waiting threads probing the
+        server every interval seconds. Returns True in the thread whose probe
+        closed it.
+        """
+        while not self.closed.is_set() and not stopped.is_set():
+            with self.lock:
+                prober = not self.probing
+                self.probing = True
+            if not prober:
+                self.closed.wait(1)
+                continue
+
+            try:
+                if stopped.wait(interval):
+                    return False
+                probe(engine)
+            except Exception:
+                continue
+            else:
+                with self.lock:
+                    self.failures = 0
+                    self.closed.set()
+                return True
+            finally:
+                with self.lock:
+                    self.probing = False
+        return False
+
+
+breakers = {}
+breakers_lock = th.Lock()
+
+
+def get_breaker(host):
+    """One breaker per server, shared by every replicator of the process"""
+    with breakers_lock:
+        if host not in breakers:
+            breakers[host] = CircuitBreaker(host)
+        return breakers[host]
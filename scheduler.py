@@ -0,0 +1,31 @@
+import time
+
+
+class Schedule:
+    """
+    Keeps the next due time of every scheduled item (e.g. a table), each on its
+    own interval.
+    """
+
+    def __init__(self):
+        self.intervals = {}
+        self.due = {}
+
+    def add(self, key, interval):
+        self.intervals[key] = interval
+        if key not in self.due:
+            self.due[key] = 0
+
+    def retain(self, keys):
+        for key in list(self.intervals):
+            if key not in keys:
+                del self.intervals[key]
+                del self.due[key]
+
+    def pop_due(self, now=None):
+        now = now or time.time()
+        return [key for key, due in self.due.items() if due <= now]
+
+    def done(self, key, now=None):
+        if key in self.intervals:
+            self.due[key] = (now or time.time()) + self.intervals[key]
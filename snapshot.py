@@ -0,0 +1,55 @@
+import datetime
+import decimal
+import json
+from checkpoint import format_value, parse_value
+from sqlalchemy import select, func
+
+
+def interpolate(low, high, parts):
+    if isinstance(low, bool):
+        return None
+    if isinstance(low, int):
+        return [low + (high - low) * i // parts for i in range(1, parts)]
+    if isinstance(low, (float, decimal.Decimal, datetime.date)):
+        return [low + (high - low) * i / parts for i in range(1, parts)]
+    return None
+
+
+def _quantiles(column, parts):
+    count = select([func.count()]).select_from(column.table).scalar()
+    return [select([column]).order_by(column).limit(1).offset(count * i // parts).scalar()
+            for i in range(1, parts)]
+
+
+def plan_ranges(src_table, column_name, parts):
+    """
+    Splits the source column into (lower, upper] ranges, the first one without
+    a lower bound. Bounds are interpolated between MIN and MAX when the type
+    allows it, otherwise they are sampled quantiles. Returns None for an empty
+    source.
+    """
+    column = src_table.c[column_name]
+    low, high = select([func.min(column), func.max(column)]).execute().first()
+    if high is None:
+        return None
+
+    bounds = interpolate(low, high, parts)
+    if bounds is None:
+        bounds = _quantiles(column, parts)
+
+    ranges = []
+    lower = None
+    for bound in sorted(set(bound for bound in bounds if bound is not None and low <= bound < high)):
+        ranges.append((lower, bound))
+        lower = bound
+    ranges.append((lower, high))
+    return ranges
+
+
+def encode_ranges(ranges):
+    return json.dumps([[None if value is None else format_value(value) for value in bounds] for bounds in ranges])
+
+
+def decode_ranges(column, encoded):
+    return [tuple(None if value is None else parse_value(column.type, value) for value in bounds)
+            for bounds in json.loads(encoded)]
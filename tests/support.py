@@ -0,0 +1,48 @@
+import shutil
+import tempfile
+import unittest
+from config import Scheme
+from helpers import get_engine
+from replicator import DbReplicator
+from sqlalchemy import event
+
+
+class ReplicationTestCase(unittest.TestCase):
+    """Source and target sqlite databases in a temporary directory"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.host = {'host': self.directory, 'port': 1, 'driver': 'sqlite', 'username': 'u', 'password': 'p'}
+        self.source = get_engine(self.scheme().source, 'src')
+        self.target = get_engine(self.scheme().target, 'trg')
+
+    def scheme(self, **options):
+        conf = dict({
+            'source': dict(self.host),
+            'target': dict(self.host),
+            'batch_size': 10,
+            'retry': {'attempts': 3, 'base_delay': 1, 'max_delay': 1, 'breaker_failures': 100},
+            'databases': [{'source': 'src', 'target': 'trg', 'naming_strategy': 'exact', 'order_by': 'id'}],
+        }, **options)
+        return Scheme('test', conf)
+
+    def replicator(self, dynamic_tables='', only_dynamic_and_views=False, **options):
+        return DbReplicator('test', self.scheme(**options), 'src', 'trg', dynamic_tables=dynamic_tables,
+                            only_dynamic_and_views=only_dynamic_and_views, order_by='id')
+
+    def fail_commits(self, replicator, when, error=None):
+        """Makes the commits of the target sessions for which when(changes) is true fail once"""
+        failed = []
+
+        def before_commit(session):
+            changes = session.info.get(replicator.checkpoints, [])
+            if not failed and when(changes):
+                failed.append(changes)
+                raise error or RuntimeError('commit failed')
+
+        event.listen(replicator.TargetSession, 'before_commit', before_commit)
+        return failed
+
+    def rows(self, engine, query):
+        return [tuple(row) for row in engine.execute(query)]
@@ -0,0 +1,104 @@
+import unittest
+from checkpoint import CheckpointStore, FINGERPRINT, WATERMARK
+from sqlalchemy.orm import sessionmaker
+from tests.support import ReplicationTestCase
+
+
+class CheckpointStoreTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.store = CheckpointStore(self.target, 'test', 'trg')
+        self.Session = sessionmaker(bind=self.target)
+
+    def write(self, table_name, value, commit=True):
+        session = self.Session()
+        try:
+            self.store.set(session, table_name, value)
+            if commit:
+                session.commit()
+            else:
+                session.rollback()
+        finally:
+            session.close()
+
+    def test_cached_on_commit_only(self):
+        self.write('t', 10)
+        self.write('t', 20, commit=False)
+        self.assertEqual(self.store.get('t'), '10')
+        self.write('t', 30)
+        self.assertEqual(self.store.get('t'), '30')
+
+    def test_delete_cached_on_commit_only(self):
+        self.write('t', 10)
+        session = self.Session()
+        self.store.delete(session, 't')
+        self.assertEqual(self.store.get('t'), '10')
+        session.commit()
+        session.close()
+        self.assertIsNone(self.store.get('t'))
+
+    def test_invalidate_reloads_committed_value(self):
+        self.write('t', 10)
+        self.store.cache[('t', WATERMARK)] = '99'
+        self.store.invalidate('t')
+        self.assertEqual(self.store.get('t'), '10')
+
+
+class CommitFailureTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)')
+        self.source.execute('CREATE TABLE dyn (id INTEGER PRIMARY KEY, payload TEXT)')
+        for i in range(35):
+            self.source.execute('INSERT INTO events VALUES (?, ?)', (i, 'p%s' % i))
+            self.source.execute('INSERT INTO dyn VALUES (?, ?)', (i, 'p%s' % i))
+
+    def assert_resumed_after_failed_commit(self, replicator):
+        failed = self.fail_commits(replicator, lambda changes: ('events', WATERMARK, '19') in changes)
+        replicator.run()
+
+        # the table is skipped for the cycle, from the last committed batch
+        self.assertTrue(failed)
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*), MAX(id) FROM events'), [(10, 9)])
+        self.assertEqual(replicator.checkpoints.get('events'), '9')
+
+        # next cycle of the same replicator
+        replicator.run()
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*), MIN(id), MAX(id) FROM events'), [(35, 0, 34)])
+        self.assertEqual(replicator.checkpoints.get('events'), '34')
+
+    def test_include_resumed_after_failed_commit(self):
+        self.assert_resumed_after_failed_commit(self.replicator())
+
+    def test_pipelined_include_resumed_after_failed_commit(self):
+        self.assert_resumed_after_failed_commit(self.replicator(pipeline_depth=2))
+
+    def test_fingerprint_not_cached_for_failed_dynamic_copy(self):
+        replicator = self.replicator(dynamic_tables='^dyn$', only_dynamic_and_views=True)
+        replicator.prepare()
+        replicator.checkpoints.load()
+        src_table = replicator.src_metadata.tables['dyn']
+        table = replicator._to_target_table(replicator.trg_metadata, src_table)
+        table.create(checkfirst=True)
+        failed = self.fail_commits(replicator, lambda changes: True)
+
+        self.assertFalse(replicator._copy_dynamic(src_table, table, fingerprint='f1'))
+        self.assertTrue(failed)
+        self.assertIsNone(replicator.checkpoints.get('dyn', name=FINGERPRINT))
+        self.assertTrue(replicator._copy_dynamic(src_table, table, fingerprint='f2'))
+        self.assertEqual(replicator.checkpoints.get('dyn', name=FINGERPRINT), 'f2')
+
+    def test_set_checkpoint_not_cached_when_commit_fails(self):
+        replicator = self.replicator()
+        replicator._set_checkpoint('events', 'f1', FINGERPRINT)
+        self.fail_commits(replicator, lambda changes: True)
+
+        with self.assertRaises(RuntimeError):
+            replicator._set_checkpoint('events', 'f2', FINGERPRINT)
+        self.assertEqual(replicator.checkpoints.get('events', name=FINGERPRINT), 'f1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import unittest
+import zlib
+from diffsync import ChunkDiff
+from sqlalchemy import MetaData, Table, event
+from tests.support import ReplicationTestCase
+
+
+class BitXor:
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        self.value ^= value or 0
+
+    def finalize(self):
+        return self.value
+
+
+def add_functions(connection, record):
+    connection.create_function('crc32', 1, lambda value: zlib.crc32(str(value).encode()))
+    connection.create_function('concat_ws', -1, lambda sep, *values: sep.join(str(v) for v in values if v is not None))
+    connection.create_aggregate('bit_xor', 1, BitXor)
+
+
+class ChunkDiffTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for engine in (self.source, self.target):
+            event.listen(engine, 'connect', add_functions)
+            engine.execute('CREATE TABLE items (tenant_id INTEGER, id INTEGER, v TEXT, PRIMARY KEY (tenant_id, id))')
+            for i in range(1, 201):
+                engine.execute('INSERT INTO items VALUES (1, ?, ?)', (i, 'v%s' % i))
+
+    def differ(self):
+        tables = [Table('items', MetaData(bind=engine), autoload=True) for engine in (self.source, self.target)]
+        return ChunkDiff(*tables, leaf_rows=10)
+
+    def test_splits_composite_key_with_single_leading_value(self):
+        self.target.execute("UPDATE items SET v = 'changed' WHERE id = 57")
+        self.target.execute('DELETE FROM items WHERE id = 150')
+        differ = self.differ()
+
+        ranges = list(differ.mismatched())
+        self.assertEqual(len(ranges), 2)
+        upserts, deletes = [], []
+        for lower, upper in ranges:
+            rows = differ._rows(differ.src_table, lower, upper)
+            self.assertLessEqual(len(rows), 10)
+            range_upserts, range_deletes = differ.diff(lower, upper)
+            upserts.extend(differ.key(row) for row in range_upserts)
+            deletes.extend(range_deletes)
+        self.assertEqual(sorted(upserts), [(1, 57), (1, 150)])
+        self.assertEqual(deletes, [(1, 57)])
+
+    def test_identical_tables(self):
+        self.assertEqual(list(self.differ().mismatched()), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,26 @@
+import unittest
+from tests.support import ReplicationTestCase
+
+
+class DynamicSwapTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE dyn (id INTEGER PRIMARY KEY, payload TEXT)')
+        for i in range(1, 21):
+            self.source.execute('INSERT INTO dyn VALUES (?, ?)', (i, 'p%s' % i))
+
+    def test_swap_drops_leftover_old_table(self):
+        replicator = self.replicator(dynamic_tables='^dyn$', only_dynamic_and_views=True, dynamic_swap=True)
+        replicator.run()
+        # left behind by a swap interrupted between its rename and its drop
+        self.target.execute('CREATE TABLE dyn__old (id INTEGER PRIMARY KEY)')
+        self.source.execute('INSERT INTO dyn VALUES (21, ?)', ('p21',))
+
+        replicator.run()
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*), MAX(id) FROM dyn'), [(21, 21)])
+        self.assertEqual(self.rows(self.target, "SELECT name FROM sqlite_master WHERE name LIKE 'dyn\\_\\_%' ESCAPE '\\'"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
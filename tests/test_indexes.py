@@ -0,0 +1,32 @@
+import unittest
+from checkpoint import INDEXES, WATERMARK
+from sqlalchemy import exc, inspect
+from tests.support import ReplicationTestCase
+
+
+class DeferredIndexesTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, k INTEGER, payload TEXT)')
+        self.source.execute('CREATE INDEX ix_k ON events (k)')
+        for i in range(35):
+            self.source.execute('INSERT INTO events VALUES (?, ?, ?)', (i, i % 3, 'p%s' % i))
+
+    def index_names(self):
+        return {index['name'] for index in inspect(self.target).get_indexes('events')}
+
+    def test_built_after_a_retried_batch(self):
+        replicator = self.replicator(defer_indexes=True)
+        lock_wait = exc.OperationalError('COMMIT', {}, Exception(1205, 'Lock wait timeout exceeded'))
+        failed = self.fail_commits(replicator, lambda changes: ('events', WATERMARK, '19') in changes, lock_wait)
+        replicator.run()
+
+        self.assertTrue(failed)
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*) FROM events'), [(35,)])
+        self.assertIn('ix_k', self.index_names())
+        self.assertIsNone(replicator.checkpoints.get('events', name=INDEXES))
+
+
+if __name__ == '__main__':
+    unittest.main()
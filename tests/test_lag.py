@@ -0,0 +1,60 @@
+import unittest
+from unittest import mock
+from checkpoint import WATERMARK
+from metrics import metrics
+from sqlalchemy import event
+from tests.support import ReplicationTestCase
+
+
+class LagTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+        metrics.enabled = True
+        self.addCleanup(setattr, metrics, 'enabled', False)
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)')
+        for i in range(0, 350, 10):
+            self.source.execute('INSERT INTO events VALUES (?, ?)', (i, 'p%s' % i))
+
+    def lag(self):
+        return metrics.gauges[metrics._key('timeds_replication_lag', {'scheme': 'test', 'db': 'trg', 'table': 'events'})]
+
+    def test_lag_of_a_table_left_behind(self):
+        replicator = self.replicator()
+        self.fail_commits(replicator, lambda changes: ('events', WATERMARK, '190') in changes)
+        replicator.run()
+
+        # skipped for the cycle after its first batch, up to id 90
+        self.assertEqual(self.lag(), 340 - 90)
+        replicator.run()
+        self.assertEqual(self.lag(), 0)
+
+    def count_max_queries(self, replicator):
+        queries = []
+        event.listen(replicator.src_engine, 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: queries.append(statement) if 'max(' in statement else None)
+        return queries
+
+    def test_lag_measured_once_per_cycle(self):
+        replicator = self.replicator()
+        queries = self.count_max_queries(replicator)
+        replicator.run()
+
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(self.lag(), 0)
+
+    def test_idle_table_lag_without_queries(self):
+        replicator = self.replicator(skip_idle_tables=True)
+        with mock.patch('replicator.get_table_activity', return_value={'events': '35@t@350'}):
+            replicator.run()
+            metrics.reset()
+            queries = self.count_max_queries(replicator)
+            replicator.run()
+
+        self.assertEqual(queries, [])
+        self.assertEqual(self.lag(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+from tests.support import ReplicationTestCase
+
+
+class ColumnOrderTest(ReplicationTestCase):
+    """The target table already exists with its columns in another order than the source's"""
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, a TEXT, b TEXT)')
+        self.target.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, b TEXT, a TEXT)')
+        for i in range(25):
+            self.source.execute('INSERT INTO events VALUES (?, ?, ?)', (i, 'a%s' % i, 'b%s' % i))
+
+    def assert_columns_kept(self, **options):
+        self.replicator(**options).run()
+        self.assertEqual(self.rows(self.target, 'SELECT id, a, b FROM events ORDER BY id'),
+                         [(i, 'a%s' % i, 'b%s' % i) for i in range(25)])
+
+    def test_rows(self):
+        self.assert_columns_kept()
+
+    def test_raw_fetch(self):
+        self.assert_columns_kept(raw_fetch=True)
+
+    def test_raw_fetch_streamed(self):
+        self.assert_columns_kept(raw_fetch=True, stream_fetch=True)
+
+
+class SchemaChangeTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, a TEXT)')
+        for i in range(15):
+            self.source.execute('INSERT INTO events VALUES (?, ?)', (i, 'a%s' % i))
+
+    def test_raw_fetch_after_added_column(self):
+        replicator = self.replicator(raw_fetch=True)
+        replicator.run()
+        for engine in (self.source, self.target):
+            engine.execute('ALTER TABLE events ADD COLUMN b TEXT')
+        for i in range(15, 30):
+            self.source.execute('INSERT INTO events VALUES (?, ?, ?)', (i, 'a%s' % i, 'b%s' % i))
+
+        replicator.run()
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*), MAX(id), MAX(b) FROM events WHERE id >= 15'),
+                         [(15, 29, 'b29')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import unittest
+from retry import is_transient, is_connection_error
+from sqlalchemy import exc
+
+
+def mysql_error(error_type, code, message):
+    return error_type('SELECT 1', {}, Exception(code, message))
+
+
+class ClassificationTest(unittest.TestCase):
+
+    def test_lost_connection_is_transient_and_counts_for_the_breaker(self):
+        error = mysql_error(exc.OperationalError, 2013, 'Lost connection to MySQL server during query')
+        self.assertTrue(is_transient(error))
+        self.assertTrue(is_connection_error(error))
+
+    def test_lock_wait_is_transient_but_not_a_connection_error(self):
+        for code in (1205, 1213):
+            error = mysql_error(exc.OperationalError, code, 'Lock wait timeout exceeded')
+            self.assertTrue(is_transient(error))
+            self.assertFalse(is_connection_error(error))
+
+    def test_schema_and_privilege_errors_are_not_transient(self):
+        # pymysql raises InternalError for unmapped codes and OperationalError for access denied
+        for error in (mysql_error(exc.InternalError, 1054, "Unknown column 'x' in 'field list'"),
+                      mysql_error(exc.OperationalError, 1045, 'Access denied for user')):
+            self.assertFalse(is_transient(error))
+            self.assertFalse(is_connection_error(error))
+
+    def test_invalidated_connection_is_a_connection_error(self):
+        error = exc.OperationalError('SELECT 1', {}, Exception('gone'), connection_invalidated=True)
+        self.assertTrue(is_transient(error))
+        self.assertTrue(is_connection_error(error))
+
+
+if __name__ == '__main__':
+    unittest.main()
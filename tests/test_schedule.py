@@ -0,0 +1,47 @@
+import time
+import unittest
+from executor import ReplicationPool
+from replicator import DbReplicator
+from tests.support import ReplicationTestCase
+
+
+class DaemonViewsTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE dyn (id INTEGER PRIMARY KEY, payload TEXT)')
+        self.source.execute('CREATE VIEW v AS SELECT id FROM dyn')
+        for i in range(1, 21):
+            self.source.execute('INSERT INTO dyn VALUES (?, ?)', (i, 'p%s' % i))
+
+    def test_views_wait_for_dynamic_tables(self):
+        replicator = DbReplicator('test', self.scheme(dynamic_interval=60), 'src', 'trg', dynamic_tables='^dyn$',
+                                  order_by='id', scheduled=True)
+        events = []
+        do_dynamic, do_views = replicator._do_dynamic, replicator._do_views
+
+        def slow_dynamic(*args):
+            events.append('dynamic start')
+            time.sleep(0.3)
+            do_dynamic(*args)
+            events.append('dynamic end')
+
+        def views(*args):
+            events.append('views')
+            do_views(*args)
+
+        replicator._do_dynamic, replicator._do_views = slow_dynamic, views
+        pool = ReplicationPool(4)
+        self.addCleanup(pool.shutdown)
+        deadline = time.time() + 10
+        while 'views' not in events and time.time() < deadline:
+            replicator.submit_due(pool)
+            time.sleep(0.05)
+        pool.join()
+
+        self.assertEqual(events, ['dynamic start', 'dynamic end', 'views'])
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*) FROM v'), [(20,)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+from checkpoint import SNAPSHOT
+from tests.support import ReplicationTestCase
+
+
+class SnapshotTest(ReplicationTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.source.execute('CREATE TABLE events (id INTEGER PRIMARY KEY, payload TEXT)')
+        for i in range(1, 101):
+            self.source.execute('INSERT INTO events VALUES (?, ?)', (i, 'p%s' % i))
+
+    def test_failed_range_resumes_from_its_progress(self):
+        replicator = self.replicator(snapshot_workers=2)
+        failed = self.fail_commits(replicator, lambda changes: any(
+            (name or '').startswith(SNAPSHOT + ':') and value == '["70"]'
+            for _, name, value in changes))
+        replicator.run()
+
+        self.assertTrue(failed)
+        self.assertIsNotNone(replicator.checkpoints.get('events', name=SNAPSHOT))
+        progress = [replicator.checkpoints.get('events', name='%s:%s' % (SNAPSHOT, i)) for i in range(2)]
+        self.assertIn('["60"]', progress)
+
+        replicator.run()
+        self.assertEqual(self.rows(self.target, 'SELECT COUNT(*), MIN(id), MAX(id) FROM events'), [(100, 1, 100)])
+        self.assertIsNone(replicator.checkpoints.get('events', name=SNAPSHOT))
+        self.assertEqual(replicator.checkpoints.get('events'), '100')
+
+
+if __name__ == '__main__':
+    unittest.main()
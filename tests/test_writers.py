@@ -0,0 +1,89 @@
+import datetime
+import unittest
+from sqlalchemy import MetaData, Table, Column, Integer, Interval, String
+from sqlalchemy.dialects import mysql
+from writers import MySQLLoadDataWriter, LoadDataError, _field
+
+
+class FakeCursor:
+    def __init__(self, warnings):
+        self.statements = []
+        self.loaded = None
+        self.warnings = warnings
+
+    def execute(self, statement, args=None):
+        self.statements.append(statement)
+        if args:
+            with open(args[0], 'rb') as tsv:
+                self.loaded = tsv.read()
+
+    def fetchall(self):
+        return self.warnings
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, cursor):
+        # the DBAPI connection of a SQLAlchemy connection
+        self.connection = self
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+class FakeSession:
+    """Just enough of a session on a MySQL connection for the LOAD DATA writer"""
+
+    def __init__(self, warnings=()):
+        self.cursor = FakeCursor(list(warnings))
+        self.bind = FakeConnection(self.cursor)
+        self.bind.dialect = mysql.dialect()
+
+    def connection(self):
+        return self.bind
+
+    def execute(self, statement):
+        return self
+
+    def scalar(self):
+        return 1
+
+
+class LoadDataTest(unittest.TestCase):
+
+    def setUp(self):
+        # target columns in another order than the source's
+        self.table = Table('events', MetaData(), Column('id', Integer, primary_key=True),
+                           Column('b', String(10)), Column('a', String(10)), Column('t', Interval))
+        self.writer = MySQLLoadDataWriter()
+        self.writer.min_rows = 1
+
+    def write(self, session, rows):
+        self.writer.write(session, self.table, rows, columns=['id', 'a', 'b', 't'])
+
+    def test_columns_in_the_order_of_the_values(self):
+        session = FakeSession()
+        self.write(session, [(1, 'a1', 'b1', datetime.timedelta(hours=1))])
+        self.assertTrue(session.cursor.statements[0].endswith('(id, a, b, t)'))
+        self.assertEqual(session.cursor.loaded, b'1\ta1\tb1\t01:00:00\n')
+
+    def test_warnings_fail_the_batch(self):
+        session = FakeSession([('Warning', 1062, "Duplicate entry '1' for key 'PRIMARY'")])
+        with self.assertRaises(LoadDataError):
+            self.write(session, [(1, 'a1', 'b1', None)])
+
+    def test_notes_are_ignored(self):
+        self.write(FakeSession([('Note', 1051, 'Unknown table')]), [(1, 'a1', 'b1', None)])
+
+    def test_time_fields(self):
+        self.assertEqual(_field(datetime.timedelta(days=1, hours=2)), b'26:00:00')
+        self.assertEqual(_field(datetime.timedelta(hours=-1)), b'-01:00:00')
+        self.assertEqual(_field(datetime.timedelta(minutes=-90, microseconds=-5)), b'-01:30:00.000005')
+        self.assertEqual(_field(datetime.timedelta(seconds=5, microseconds=250)), b'00:00:05.000250')
+
+
+if __name__ == '__main__':
+    unittest.main()
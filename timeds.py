@@ -1,10 +1,68 @@
 import argparse
+import signal
 import sys
+import threading as th
+import time
 import config as conf
+from budget import memory_budget
+from executor import ReplicationPool
+from hooks import Hooks
 from log import Log
+from metrics import metrics
+from processes import run_processes
+from profiling import Profiler
 from replicator import SchemeReplicator
 
 
+def run_daemon(config, args, log, pool, stopped, hooks, shard=None):
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopped.set())
+
+    schemes = [SchemeReplicator(scheme, config[scheme], only_dynamic_and_views=args.only_dynamic_and_views,
+                                scheduled=True, interval=args.interval, hooks=hooks, shard=shard) for scheme in config]
+    discovery_interval = min([config[scheme].discovery_interval for scheme in config] or [args.interval])
+
+    next_discovery = 0
+    while not stopped.is_set():
+        if time.time() >= next_discovery:
+            next_discovery = time.time() + discovery_interval
+            replicators = []
+            for scheme in schemes:
+                try:
+                    replicators.extend(scheme.discover(pool))
+                except Exception as e:
+                    log.exception(e, scheme=scheme.scheme)
+            log.info('Running for %s database(s)...' % (len(replicators)))
+
+        for scheme in schemes:
+            scheme.submit_due(pool)
+        stopped.wait(1)
+
+    for scheme in schemes:
+        scheme.stop()
+
+
+def replicate(config, args, log, stopped, hooks, shard=None):
+    """Replicates once, or until stopped in daemon mode, on a pool of args.workers threads"""
+    memory_budget.limit = args.memory_budget * 1024 * 1024
+    pool = ReplicationPool(args.workers)
+    if args.daemon:
+        run_daemon(config, args, log, pool, stopped, hooks, shard)
+        pool.shutdown()
+        return
+
+    replicators = []
+    for scheme in config:
+        scheme = SchemeReplicator(
+            scheme, config[scheme], only_dynamic_and_views=args.only_dynamic_and_views, hooks=hooks, shard=shard)
+        reps = scheme.run(pool)
+        replicators.extend(reps)
+
+    log.info('Started for %s database(s)...' % (len(replicators)))
+    pool.join()
+    pool.shutdown()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description='Replicate databases using Timestamps in SQL Tables')
@@ -14,28 +72,56 @@ def main():
                         help='Verbose Mode. Print config, etc')
     parser.add_argument('--only-dynamic-and-views', '-d', action='store_true',
                         help='Only replicate dynamic tables and views')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and replicate every table on its own interval')
+    parser.add_argument('--workers', '-w', type=int, default=8, action='store',
+                        help='Maximum number of tables replicated at once')
+    parser.add_argument('--metrics-port', type=int, default=0, action='store',
+                        help='Serve Prometheus metrics on this port')
+    parser.add_argument('--metrics-file', default='', action='store',
+                        help='Periodically write Prometheus metrics to this textfile')
+    parser.add_argument('--interval', type=int, default=60, action='store',
+                        help='Default replication interval in seconds in daemon mode')
+    parser.add_argument('--profile', default='', action='store',
+                        help='Write per-thread cProfile dumps and a phase trace/summary to this directory at the end')
+    parser.add_argument('--memory-budget', type=int, default=0, action='store',
+                        help='Megabytes of streamed batches held at once by a process (0 for no limit)')
+    parser.add_argument('--processes', '-p', type=int, default=1, action='store',
+                        help='Shard the databases over this many worker processes')
 
     args = parser.parse_args()
     log = Log()
-    replicators = []
+    stopped = th.Event()
+    metrics_writer = None
+    hooks = Hooks()
+    profiler = None
+
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.metrics_file:
+        metrics_writer = metrics.write_periodically(args.metrics_file, 15, stopped)
+    if args.profile and args.processes <= 1:
+        profiler = Profiler(args.profile)
+        profiler.start(hooks)
 
     try:
         config = conf.Config(args.config)
         if args.verbose:
             print(config)
 
-        for scheme in config:
-            scheme = SchemeReplicator(
-                scheme, config[scheme], only_dynamic_and_views=args.only_dynamic_and_views)
-            reps = scheme.run()
-            replicators.extend(reps)
-
-        log.info('Started for %s database(s)...' % (len(replicators)))
-        for rep in replicators:
-            rep.join()
+        if args.processes > 1:
+            run_processes(replicate, args, log, stopped)
+        else:
+            replicate(config, args, log, stopped, hooks)
 
     except conf.ConfigException as e:
         log.exception(e)
+    finally:
+        stopped.set()
+        if metrics_writer:
+            metrics_writer.join()
+        if profiler:
+            profiler.stop()
 
 
 if __name__ == "__main__":
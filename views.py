@@ -0,0 +1,28 @@
+import re
+
+
+def view_dependencies(definitions):
+    """view => the other views its definition mentions"""
+    names = set(definitions)
+    return {name: (set(re.findall(r'[\w$]+', definition)) & names) - {name}
+            for name, definition in definitions.items()}
+
+
+def view_levels(dependencies):
+    """
+    Groups views so that every view only depends on views of earlier groups.
+    Views caught in a dependency cycle end up together in the last group.
+    """
+    remaining = {name: set(depends) & set(dependencies) for name, depends in dependencies.items()}
+    levels = []
+    while remaining:
+        level = sorted(name for name, depends in remaining.items() if not depends)
+        if not level:
+            levels.append(sorted(remaining))
+            break
+        levels.append(level)
+        for name in level:
+            del remaining[name]
+        for depends in remaining.values():
+            depends.difference_update(level)
+    return levels
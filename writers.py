@@ -0,0 +1,140 @@
+import datetime
+import json
+import tempfile
+import threading as th
+
+
+class ExecutemanyWriter:
+    """
+    Writes a batch with a single executemany INSERT. Plain tuples (raw_fetch)
+    are written with an INSERT built once per table and column order straight
+    on the DBAPI cursor.
+    """
+
+    def __init__(self):
+        self.statements = {}
+
+    def _statement(self, dialect, table, columns):
+        key = (dialect.name, table.name, tuple(columns))
+        if key not in self.statements:
+            # compiled INSERTs list the columns in table order, raw rows come in the order of the source
+            preparer = dialect.identifier_preparer
+            marker = '?' if dialect.paramstyle == 'qmark' else '%s'
+            self.statements[key] = 'INSERT INTO %s (%s) VALUES (%s)' % (
+                preparer.format_table(table), ', '.join(preparer.quote(column) for column in columns),
+                ', '.join([marker] * len(columns)))
+        return self.statements[key]
+
+    def write(self, session, table, values, columns=None):
+        """columns names the values of plain tuples, in order"""
+        if not isinstance(values[0], tuple):
+            session.execute(table.insert(None), values)
+            return
+
+        connection = session.connection()
+        cursor = connection.connection.cursor()
+        try:
+            cursor.executemany(self._statement(connection.dialect, table, columns), values)
+        finally:
+            cursor.close()
+
+
+def _escape(data):
+    return data.replace(b'\\', b'\\\\').replace(b'\t', b'\\t').replace(b'\n', b'\\n') \
+        .replace(b'\r', b'\\r').replace(b'\0', b'\\0')
+
+
+def _time(value):
+    """[-]HH:MM:SS[.ffffff], str() of a timedelta gives '1 day, 2:00:00' or '-1 day, 23:00:00'"""
+    microseconds = (value.days * 86400 + value.seconds) * 1000000 + value.microseconds
+    sign = '-' if microseconds < 0 else ''
+    seconds, microseconds = divmod(abs(microseconds), 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    fraction = '.%06d' % microseconds if microseconds else ''
+    return ('%s%02d:%02d:%02d%s' % (sign, hours, minutes, seconds, fraction)).encode('ascii')
+
+
+def _field(value):
+    if value is None:
+        return b'\\N'
+    if isinstance(value, bool):
+        return b'1' if value else b'0'
+    if isinstance(value, (bytes, bytearray)):
+        return _escape(bytes(value))
+    if isinstance(value, float):
+        return repr(value).encode('ascii')
+    if isinstance(value, datetime.timedelta):
+        return _time(value)
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    elif isinstance(value, (set, frozenset)):
+        value = ','.join(sorted(value))
+    return _escape(str(value).encode('utf-8'))
+
+
+class LoadDataError(Exception):
+    pass
+
+
+class MySQLLoadDataWriter(ExecutemanyWriter):
+    """
+    Serializes a batch to a temporary tab separated file and bulk loads it with
+    LOAD DATA LOCAL INFILE. Falls back to executemany for small batches and
+    when the server does not allow local_infile.
+
+    LOAD DATA LOCAL turns duplicate keys and conversion errors into warnings,
+    as IGNORE does, so a load with warnings fails the batch.
+    """
+
+    min_rows = 1000
+
+    def __init__(self):
+        super().__init__()
+        self.available = None
+        self.lock = th.Lock()
+
+    def _is_available(self, session):
+        with self.lock:
+            if self.available is None:
+                try:
+                    self.available = bool(session.execute('SELECT @@GLOBAL.local_infile').scalar())
+                except Exception:
+                    self.available = False
+            return self.available
+
+    def write(self, session, table, values, columns=None):
+        if len(values) < self.min_rows or not self._is_available(session):
+            return super().write(session, table, values, columns=columns)
+
+        preparer = session.bind.dialect.identifier_preparer
+        # the order of the values, which need not be the order of the target columns
+        columns = list(columns or values[0].keys())
+        with tempfile.NamedTemporaryFile(prefix='timeds-', suffix='.tsv') as tsv:
+            for row in values:
+                tsv.write(b'\t'.join(_field(value) for value in row) + b'\n')
+            tsv.flush()
+
+            cursor = session.connection().connection.cursor()
+            try:
+                cursor.execute("LOAD DATA LOCAL INFILE %%s INTO TABLE %s CHARACTER SET binary "
+                               "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' (%s)" % (
+                                   preparer.format_table(table), ', '.join(preparer.quote(column) for column in columns)),
+                               (tsv.name,))
+                cursor.execute('SHOW WARNINGS LIMIT 10')
+                warnings = [row for row in cursor.fetchall() if row[0] != 'Note']
+                if warnings:
+                    raise LoadDataError('LOAD DATA into %s had warnings: %s' % (
+                        table.name, '; '.join('%s %s: %s' % tuple(row) for row in warnings)))
+            finally:
+                cursor.close()
+
+
+writers = {
+    'executemany': ExecutemanyWriter,
+    'load_data': MySQLLoadDataWriter,
+}
+
+
+def get_writer(name):
+    return writers[name]()